@@ -9,8 +9,56 @@ POSTGRES_PORT = os.environ.get("POSTGRES_PORT")
 POSTGRES_DATABASE = os.environ.get("POSTGRES_DATABASE")
 POSTGRES_USERNAME = os.environ.get("POSTGRES_USERNAME")
 POSTGRES_PASSWORD = os.environ.get("POSTGRES_PASSWORD")
-POSTGRES_CONN = f'postgresql+psycopg2://{POSTGRES_USERNAME}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DATABASE}'
+POSTGRES_CONN = f'postgresql+asyncpg://{POSTGRES_USERNAME}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DATABASE}'
 
 SECRET_KEY = os.environ.get("SECRET_KEY")
 ALGORITHM = os.environ.get("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES")
+REFRESH_TOKEN_EXPIRE_DAYS = os.environ.get("REFRESH_TOKEN_EXPIRE_DAYS", "30")
+REFRESH_TOKEN_PURGE_INTERVAL_SECONDS = os.environ.get("REFRESH_TOKEN_PURGE_INTERVAL_SECONDS", "3600")
+
+USER_CACHE_TTL_SECONDS = os.environ.get("USER_CACHE_TTL_SECONDS", "60")
+USER_CACHE_MAXSIZE = os.environ.get("USER_CACHE_MAXSIZE", "10000")
+
+BCRYPT_ROUNDS = os.environ.get("BCRYPT_ROUNDS", "12")
+PASSWORD_HASH_WORKERS = os.environ.get("PASSWORD_HASH_WORKERS", "4")
+PASSWORD_HASH_MAX_QUEUE = os.environ.get("PASSWORD_HASH_MAX_QUEUE", "100")
+
+NOTES_PAGE_DEFAULT_LIMIT = os.environ.get("NOTES_PAGE_DEFAULT_LIMIT", "50")
+NOTES_PAGE_MAX_LIMIT = os.environ.get("NOTES_PAGE_MAX_LIMIT", "500")
+
+BULK_MAX_ITEMS = os.environ.get("BULK_MAX_ITEMS", "10000")
+EXPORT_BATCH_SIZE = os.environ.get("EXPORT_BATCH_SIZE", "500")
+
+FTS_CONFIG = os.environ.get("FTS_CONFIG", "simple")
+
+# REDIS
+REDIS_HOST = os.environ.get("REDIS_HOST")
+REDIS_NUM_DB = os.environ.get("REDIS_NUM_DB")
+REDIS_PORT = os.environ.get("REDIS_PORT")
+REDIS_URL = f'redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_NUM_DB}'
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+RESPONSE_CACHE_TTL_SECONDS = os.environ.get("RESPONSE_CACHE_TTL_SECONDS", "300")
+
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_DEFAULT_RPS = os.environ.get("RATE_LIMIT_DEFAULT_RPS", "20")
+RATE_LIMIT_DEFAULT_BURST = os.environ.get("RATE_LIMIT_DEFAULT_BURST", "40")
+RATE_LIMIT_LOGIN_PER_MINUTE = os.environ.get("RATE_LIMIT_LOGIN_PER_MINUTE", "10")
+RATE_LIMIT_LOGIN_IP_PER_MINUTE = os.environ.get("RATE_LIMIT_LOGIN_IP_PER_MINUTE", "30")
+RATE_LIMIT_BULK_PER_MINUTE = os.environ.get("RATE_LIMIT_BULK_PER_MINUTE", "10")
+# Общий секрет доверенного клиента (бота): его запросы не попадают в лимиты по IP
+RATE_LIMIT_CLIENT_KEY = os.environ.get("RATE_LIMIT_CLIENT_KEY")
+
+DB_POOL_SIZE = os.environ.get("DB_POOL_SIZE", "5")
+DB_MAX_OVERFLOW = os.environ.get("DB_MAX_OVERFLOW", "10")
+DB_POOL_TIMEOUT = os.environ.get("DB_POOL_TIMEOUT", "30")
+DB_POOL_RECYCLE = os.environ.get("DB_POOL_RECYCLE", "1800")
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_SLOW_QUERY_MS = os.environ.get("DB_SLOW_QUERY_MS", "500")
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_INFO_SAMPLE_RATE = os.environ.get("LOG_INFO_SAMPLE_RATE", "1.0")
+LOG_JSON = os.environ.get("LOG_JSON", "true").lower() == "true"
+
+# Токен для /stats/*; пока не задан, эндпоинты отключены
+STATS_TOKEN = os.environ.get("STATS_TOKEN")
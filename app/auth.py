@@ -1,29 +1,104 @@
+import asyncio
+import hashlib
+import secrets
+from concurrent.futures import ThreadPoolExecutor
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status 
-from sqlalchemy.orm import Session
+from fastapi import Depends, Header, HTTPException, status 
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy import select
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from app.database import get_db
 from app.models import User
-from app.app_config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.schemas import User as UserSchema
+from app.cache import TTLCache
+from app.metrics import callback_metrics
+from app.app_config import (SECRET_KEY,
+                            ALGORITHM,
+                            ACCESS_TOKEN_EXPIRE_MINUTES,
+                            USER_CACHE_TTL_SECONDS,
+                            USER_CACHE_MAXSIZE,
+                            BCRYPT_ROUNDS,
+                            PASSWORD_HASH_WORKERS,
+                            PASSWORD_HASH_MAX_QUEUE,
+                            STATS_TOKEN)
 
+# min/max совпадают с default, чтобы при смене стоимости хэш пересчитывался при логине
 pwd_context = CryptContext(
     schemes=["bcrypt"],
       deprecated="auto",
+      bcrypt__default_rounds=int(BCRYPT_ROUNDS),
+      bcrypt__min_rounds=int(BCRYPT_ROUNDS),
+      bcrypt__max_rounds=int(BCRYPT_ROUNDS),
       )
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+# Кэш пользователей по subject токена, чтобы не ходить в БД на каждый запрос
+user_cache = TTLCache(
+    maxsize=int(USER_CACHE_MAXSIZE),
+    ttl=int(USER_CACHE_TTL_SECONDS),
+    )
+
+# bcrypt выполняется в отдельном пуле потоков, чтобы не блокировать event loop
+hash_executor = ThreadPoolExecutor(
+    max_workers=int(PASSWORD_HASH_WORKERS),
+    thread_name_prefix="bcrypt",
+    )
+_hash_slots = asyncio.Semaphore(int(PASSWORD_HASH_WORKERS))
+_hash_waiting = 0
+
+def hash_queue_depth() -> int:
+    return _hash_waiting
+
+callback_metrics.counter(
+    "auth_user_cache_hits",
+    "Authenticated requests resolved from the user cache",
+    lambda: user_cache.hits,
+    )
+callback_metrics.counter(
+    "auth_user_cache_misses",
+    "Authenticated requests that had to load the user from the database",
+    lambda: user_cache.misses,
+    )
+callback_metrics.gauge(
+    "bcrypt_queue_depth",
+    "Password hashing requests waiting for a worker",
+    hash_queue_depth,
+    )
+
+async def _run_in_hash_pool(func, *args):
+    global _hash_waiting
+    if _hash_waiting >= int(PASSWORD_HASH_MAX_QUEUE):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, try again later",
+            headers={"Retry-After": "1"},
+            )
+    _hash_waiting += 1
+    try:
+        await _hash_slots.acquire()
+    finally:
+        _hash_waiting -= 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(hash_executor, func, *args)
+    finally:
+        _hash_slots.release()
 
-def verify_password(
+async def verify_password(
         plain_password: str,
         hashed_password: str,
-          ) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+          ) -> Tuple[bool, Optional[str]]:
+    # Возвращает новый хэш, если сохранённый сделан с другой стоимостью
+    return await _run_in_hash_pool(
+        pwd_context.verify_and_update,
+        plain_password,
+        hashed_password,
+        )
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+async def get_password_hash(password: str) -> str:
+    return await _run_in_hash_pool(pwd_context.hash, password)
 
 def create_access_token(
         data: dict,
@@ -42,11 +117,33 @@ def create_access_token(
         )
     return encoded_jwt
 
+# Refresh-токен случайный, а не JWT: его можно отозвать, а в БД лежит только хэш
+def new_refresh_token() -> str:
+    return secrets.token_urlsafe(32)
+
+def hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+# Служебная статистика (текст SQL, состояние пула) доступна только по отдельному токену
+def require_stats_token(x_stats_token: Optional[str] = Header(default=None)):
+    if not STATS_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not Found",
+            )
+    if not x_stats_token or not secrets.compare_digest(x_stats_token, STATS_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid stats token",
+            )
 
+def invalidate_cached_user(username: str):
+    user_cache.invalidate(username)
 
-def get_current_user(
+
+async def get_current_user(
         token: str = Depends(oauth2_scheme),
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -60,13 +157,22 @@ def get_current_user(
             algorithms=[ALGORITHM],
             )
         username: str = payload.get("sub")
+        user_id: Optional[int] = payload.get("uid")
         if username is None:
             raise credentials_exception
-        user = db.execute(select(User).filter(User.username == username)).scalars().first()
-        if user is None:
-            raise credentials_exception
     except JWTError:
         raise credentials_exception
+
+    user = user_cache.get(username)
+    if user is not None and (user_id is None or user.id == user_id):
+        return user
+
+    result = await db.execute(select(User).filter(User.username == username))
+    db_user = result.scalars().first()
+    if db_user is None or (user_id is not None and db_user.id != user_id):
+        raise credentials_exception
+    user = UserSchema.model_validate(db_user)
+    user_cache.set(username, user)
     return user
 
 
@@ -1,126 +1,630 @@
-from sqlalchemy.orm import Session
+import re
+import uuid
+from datetime import datetime, timedelta
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from sqlalchemy import bindparam, delete, func, insert, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm import defer, load_only, selectinload
+from sqlalchemy.orm.attributes import flag_modified, set_committed_value
+from sqlalchemy.sql.elements import ColumnElement
 
-from app.models import User, Note, Tag
-from app.schemas import UserCreate, NoteCreate, NoteUpdate
-from app.auth import get_password_hash
+from app.models import User, Note, NoteTombstone, RefreshToken, Tag, UserTag, note_tags
+from app.schemas import UserCreate, NoteCreate, NoteUpdate, NoteBulkUpdate
+from app.auth import (get_password_hash,
+                      invalidate_cached_user,
+                      new_refresh_token,
+                      hash_refresh_token)
+from app.app_config import FTS_CONFIG, REFRESH_TOKEN_EXPIRE_DAYS
+from app.tag_query import tag_condition
 
+# asyncpg/Postgres принимают не больше 32767 параметров в одном запросе; запас оставлен
+# под остальные параметры запроса. Вставки идут через executemany, SQLAlchemy сам режет
+# их на пачки, а списки для IN режутся здесь
+MAX_BIND_PARAMS = 32000
 
-def get_user_by_username(
-        db: Session, 
+
+def batched(items: Sequence) -> Iterator[Sequence]:
+    for start in range(0, len(items), MAX_BIND_PARAMS):
+        yield items[start:start + MAX_BIND_PARAMS]
+
+
+async def get_user_by_username(
+        db: AsyncSession, 
         username: str,
         ):
-    return db.execute(select(User).filter(User.username == username)).scalars().first()
+    result = await db.execute(select(User).filter(User.username == username))
+    return result.scalars().first()
 
-def create_user(db: Session, user: UserCreate):
-    hashed_password = get_password_hash(user.password)
+async def create_user(db: AsyncSession, user: UserCreate):
+    hashed_password = await get_password_hash(user.password)
     db_user = User(
         username=user.username,
         hashed_password=hashed_password,
         )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    invalidate_cached_user(db_user.username)
+    return db_user
+
+async def update_user_password_hash(
+        db: AsyncSession,
+        db_user: User,
+        hashed_password: str,
+        ):
+    db_user.hashed_password = hashed_password
+    await db.commit()
+    invalidate_cached_user(db_user.username)
     return db_user
 
+# Refresh-токены
+async def create_refresh_token(
+        db: AsyncSession,
+        user_id: int,
+        family_id: Optional[str] = None,
+        ) -> Tuple[RefreshToken, str]:
+    token = new_refresh_token()
+    db_token = RefreshToken(
+        user_id=user_id,
+        family_id=family_id or uuid.uuid4().hex,
+        token_hash=hash_refresh_token(token),
+        expires_at=datetime.utcnow() + timedelta(days=int(REFRESH_TOKEN_EXPIRE_DAYS)),
+        )
+    db.add(db_token)
+    await db.flush()
+    return db_token, token
+
+async def issue_refresh_token(
+        db: AsyncSession,
+        user_id: int,
+        ) -> str:
+    _, token = await create_refresh_token(
+        db=db,
+        user_id=user_id,
+        )
+    await db.commit()
+    return token
+
+async def revoke_refresh_token_family(
+        db: AsyncSession,
+        family_id: str,
+        ):
+    await db.execute(
+        update(RefreshToken)
+        .where(
+            RefreshToken.family_id == family_id,
+            RefreshToken.revoked_at.is_(None),
+            )
+        .values(revoked_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+        )
+
+async def rotate_refresh_token(
+        db: AsyncSession,
+        token: str,
+        ) -> Tuple[Optional[User], Optional[str], bool]:
+    # Возвращает (пользователь, новый токен, был ли это повтор уже использованного токена)
+    result = await db.execute(
+        select(RefreshToken)
+        .filter(RefreshToken.token_hash == hash_refresh_token(token))
+        .with_for_update()
+        )
+    db_token = result.scalars().first()
+    if db_token is None:
+        return None, None, False
+    if db_token.revoked_at is not None:
+        # Отозванный токен предъявлен повторно - вероятно, утёк, отзываем всю цепочку
+        await revoke_refresh_token_family(db, db_token.family_id)
+        await db.commit()
+        return None, None, True
+    if db_token.expires_at <= datetime.utcnow():
+        await db.rollback()
+        return None, None, False
+
+    new_db_token, new_token = await create_refresh_token(
+        db=db,
+        user_id=db_token.user_id,
+        family_id=db_token.family_id,
+        )
+    db_token.revoked_at = datetime.utcnow()
+    db_token.replaced_by = new_db_token.id
+    user = await db.get(User, db_token.user_id)
+    await db.commit()
+    return user, new_token, False
 
-def create_note(
-        db: Session, 
+async def revoke_refresh_token(
+        db: AsyncSession,
+        token: str,
+        ) -> bool:
+    result = await db.execute(
+        select(RefreshToken.family_id)
+        .filter(RefreshToken.token_hash == hash_refresh_token(token))
+        )
+    family_id = result.scalar_one_or_none()
+    if family_id is None:
+        return False
+    await revoke_refresh_token_family(db, family_id)
+    await db.commit()
+    return True
+
+# Истёкшие токены больше не нужны даже для поиска повторов: предъявить их уже нельзя.
+# Отозванные, но не истёкшие строки остаются, на них держится обнаружение утечки
+async def purge_refresh_tokens(db: AsyncSession) -> int:
+    result = await db.execute(
+        delete(RefreshToken)
+        .where(RefreshToken.expires_at <= datetime.utcnow())
+        .execution_options(synchronize_session=False)
+        )
+    await db.commit()
+    return result.rowcount
+
+# Версия заметок пользователя растёт при каждой записи, на ней строится ETag.
+# Вызывается первым в каждой записи: блокировка строки пользователя берётся до nextval
+# у change_seq, поэтому номера изменений одного пользователя идут в порядке коммитов
+# и клиент, забравший изменения после since=N, не пропустит меньший номер
+async def bump_notes_version(
+        db: AsyncSession,
+        user_id: int,
+        ):
+    await db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(notes_version=User.notes_version + 1)
+        .execution_options(synchronize_session=False)
+        )
+
+async def get_notes_version(
+        db: AsyncSession,
+        user_id: int,
+        ) -> int:
+    result = await db.execute(select(User.notes_version).filter(User.id == user_id))
+    return result.scalar_one_or_none() or 0
+
+
+async def create_note(
+        db: AsyncSession, 
         note: NoteCreate, 
         user_id: int,
         ):
+    await bump_notes_version(db, user_id)
     db_note = Note(
         title=note.title, 
         content=note.content, 
         user_id=user_id,
+        tags=[],
         )
     db.add(db_note)
-    db.commit()
-    db.refresh(db_note)
+    # Один flush: id и серверные даты возвращаются через RETURNING (eager_defaults)
+    await db.flush()
+    await update_note_tags(
+        db=db,
+        db_note=db_note,
+        new_tags=set(note.tags),
+        )
+    await db.commit()
     return db_note
 
-def get_notes(
-        db: Session, 
+async def get_notes(
+        db: AsyncSession, 
         user_id: int, 
         tag: str = None,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[datetime, int]] = None,
+        summary: bool = False,
+        tag_filter: Optional[ColumnElement] = None,
         ):
-    query = db.execute(select(Note).filter(Note.user_id == user_id))
+    query = select(Note).filter(Note.user_id == user_id).options(selectinload(Note.tags))
     if tag:
-        tag_obj = db.execute(select(Tag).filter(Tag.name == tag)).scalars().first()
-        if not tag_obj:
-            return None
-        query = db.execute(select(Note).join(Note.tags).filter(Tag.id == tag_obj.id).filter(Note.user_id == user_id))
-    return query.scalars().all()
-
-def get_note_by_id(
-        db: Session, 
+        query = query.filter(tag_condition(tag))
+    if tag_filter is not None:
+        query = query.filter(tag_filter)
+    # Keyset-пагинация по (updated_at, id), новые заметки первыми
+    if after:
+        query = query.filter(tuple_(Note.updated_at, Note.id) < after)
+    query = query.order_by(Note.updated_at.desc(), Note.id.desc())
+    if summary:
+        query = query.options(defer(Note.content))
+    if limit:
+        query = query.limit(limit)
+    result = await db.execute(query)
+    return result.scalars().all()
+
+async def stream_notes(
+        db: AsyncSession,
+        user_id: int,
+        batch_size: int,
+        ):
+    # Серверный курсор: в памяти одновременно не больше batch_size заметок
+    result = await db.stream(
+        select(Note)
+        .filter(Note.user_id == user_id)
+        .order_by(Note.id)
+        .options(selectinload(Note.tags))
+        .execution_options(yield_per=batch_size)
+        )
+    async for note in result.scalars():
+        yield note
+
+async def get_note_by_id(
+        db: AsyncSession, 
         note_id: int, 
         user_id: int,
         ):
-    return db.execute(select(Note).filter(Note.id == note_id, Note.user_id == user_id)).scalars().first()
+    result = await db.execute(
+        select(Note).filter(Note.id == note_id, Note.user_id == user_id).options(selectinload(Note.tags))
+        )
+    return result.scalars().first()
 
-def update_note(
-        db: Session, 
+async def update_note(
+        db: AsyncSession, 
         db_note: Note, 
         note_update: NoteUpdate,
         ):
+    await bump_notes_version(db, db_note.user_id)
     db_note.title = note_update.title
     db_note.content = note_update.content
+    # UPDATE выполняется всегда, чтобы updated_at и change_seq сдвинулись и при смене одних тегов
+    flag_modified(db_note, "title")
+    if note_update.tags is not None:
+        await update_note_tags(
+            db=db,
+            db_note=db_note,
+            new_tags=set(note_update.tags),
+            )
+    await db.commit()
     return db_note
 
-def delete_note(db: Session, db_note: Note):
-    db.delete(db_note)
-    db.commit()
+async def delete_note(db: AsyncSession, db_note: Note):
+    await bump_notes_version(db, db_note.user_id)
+    await adjust_user_tag_counts(
+        db=db,
+        user_id=db_note.user_id,
+        deltas={tag.id: -1 for tag in db_note.tags},
+        )
+    await db.delete(db_note)
+    db.add(NoteTombstone(
+        note_id=db_note.id,
+        user_id=db_note.user_id,
+        ))
+    await db.commit()
+
+# Синхронизация изменений
+async def get_note_changes(
+        db: AsyncSession,
+        user_id: int,
+        since: int,
+        limit: int,
+        ) -> Tuple[List[Note], List[NoteTombstone], int, bool]:
+    result = await db.execute(
+        select(Note)
+        .filter(Note.user_id == user_id, Note.change_seq > since)
+        .order_by(Note.change_seq)
+        .limit(limit + 1)
+        .options(selectinload(Note.tags))
+        )
+    notes = list(result.scalars().all())
+    result = await db.execute(
+        select(NoteTombstone)
+        .filter(NoteTombstone.user_id == user_id, NoteTombstone.change_seq > since)
+        .order_by(NoteTombstone.change_seq)
+        .limit(limit + 1)
+        )
+    tombstones = list(result.scalars().all())
+
+    # Каждая выборка берёт limit + 1 строк: первые limit изменений объединения точны,
+    # а лишняя строка любой из них означает, что изменения ещё есть
+    changes = sorted(notes + tombstones, key=lambda change: change.change_seq)
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    cursor = changes[-1].change_seq if changes else since
+    return (
+        [change for change in changes if isinstance(change, Note)],
+        [change for change in changes if isinstance(change, NoteTombstone)],
+        cursor,
+        has_more,
+        )
+
+# Пакетные операции
+async def bulk_create_notes(
+        db: AsyncSession,
+        notes: List[NoteCreate],
+        user_id: int,
+        ) -> List[int]:
+    if not notes:
+        return []
+    await bump_notes_version(db, user_id)
+    result = await db.execute(
+        insert(Note).returning(Note.id, sort_by_parameter_order=True),
+        [
+            {"title": note.title, "content": note.content, "user_id": user_id}
+            for note in notes
+            ],
+        )
+    note_ids = list(result.scalars().all())
+
+    tags = await get_or_create_tags(db, {name for note in notes for name in note.tags})
+    tag_ids = {tag.name: tag.id for tag in tags}
+    links = [
+        {"note_id": note_id, "tag_id": tag_ids[name]}
+        for note_id, note in zip(note_ids, notes)
+        for name in set(note.tags)
+        ]
+    if links:
+        await db.execute(insert(note_tags), links)
+        await adjust_user_tag_counts(
+            db=db,
+            user_id=user_id,
+            deltas=Counter(link["tag_id"] for link in links),
+            )
+    await db.commit()
+    return note_ids
+
+async def bulk_update_notes(
+        db: AsyncSession,
+        updates: List[NoteBulkUpdate],
+        user_id: int,
+        ) -> List[int]:
+    if not updates:
+        return []
+    result = await db.execute(
+        select(Note)
+        .filter(Note.id.in_([item.id for item in updates]), Note.user_id == user_id)
+        .options(load_only(Note.id), selectinload(Note.tags))
+        )
+    current_tags = {
+        note.id: {tag.name: tag.id for tag in note.tags}
+        for note in result.scalars().all()
+        }
+    updates = [item for item in updates if item.id in current_tags]
+    if not updates:
+        return []
+
+    await bump_notes_version(db, user_id)
+    await db.execute(
+        update(Note),
+        [
+            {"id": item.id, "title": item.title, "content": item.content}
+            for item in updates
+            ],
+        )
+
+    tags = await get_or_create_tags(
+        db,
+        {name for item in updates if item.tags is not None for name in item.tags},
+        )
+    tag_ids = {tag.name: tag.id for tag in tags}
+    links_to_remove, links_to_add = [], []
+    for item in updates:
+        if item.tags is None:
+            continue
+        existing, new_tags = current_tags[item.id], set(item.tags)
+        links_to_remove += [
+            (item.id, tag_id) for name, tag_id in existing.items() if name not in new_tags
+            ]
+        links_to_add += [
+            {"note_id": item.id, "tag_id": tag_ids[name]} for name in new_tags - existing.keys()
+            ]
+    if links_to_remove:
+        # executemany, как и вставка связей: один IN по парам на весь пакет упирается
+        # в лимит параметров и глубину разбора выражения в Postgres
+        await db.execute(
+            delete(note_tags).where(
+                note_tags.c.note_id == bindparam("link_note_id"),
+                note_tags.c.tag_id == bindparam("link_tag_id"),
+                ),
+            [
+                {"link_note_id": note_id, "link_tag_id": tag_id}
+                for note_id, tag_id in links_to_remove
+                ],
+            )
+    if links_to_add:
+        await db.execute(insert(note_tags), links_to_add)
+    deltas = Counter(link["tag_id"] for link in links_to_add)
+    deltas.subtract(tag_id for _, tag_id in links_to_remove)
+    await adjust_user_tag_counts(
+        db=db,
+        user_id=user_id,
+        deltas=deltas,
+        )
+    await db.commit()
+    return [item.id for item in updates]
+
+async def bulk_delete_notes(
+        db: AsyncSession,
+        note_ids: List[int],
+        user_id: int,
+        ) -> List[int]:
+    if not note_ids:
+        return []
+    await bump_notes_version(db, user_id)
+    owned_notes = select(Note.id).filter(Note.id.in_(note_ids), Note.user_id == user_id)
+    result = await db.execute(
+        delete(note_tags)
+        .where(note_tags.c.note_id.in_(owned_notes))
+        .returning(note_tags.c.tag_id)
+        )
+    removed_tags = Counter(result.scalars().all())
+    await adjust_user_tag_counts(
+        db=db,
+        user_id=user_id,
+        deltas={tag_id: -count for tag_id, count in removed_tags.items()},
+        )
+    result = await db.execute(
+        delete(Note)
+        .where(Note.id.in_(note_ids), Note.user_id == user_id)
+        .returning(Note.id)
+        .execution_options(synchronize_session=False)
+        )
+    deleted_ids = list(result.scalars().all())
+    if not deleted_ids:
+        # Ничего не удалено: версия не должна меняться
+        await db.rollback()
+        return []
+    await db.execute(
+        insert(NoteTombstone),
+        [{"note_id": note_id, "user_id": user_id} for note_id in deleted_ids],
+        )
+    await db.commit()
+    return deleted_ids
 
 # Работа с тегами
-def get_tag_by_name(
-        db: Session, 
+async def get_tag_by_name(
+        db: AsyncSession, 
         tag_name: str,
         ):
-    return db.execute(select(Tag).filter(Tag.name == tag_name)).scalars().first()
+    result = await db.execute(select(Tag).filter(Tag.name == tag_name))
+    return result.scalars().first()
 
-def create_tag(
-        db: Session, 
-        tag_name: str,
-        ):
-    tag = Tag(name=tag_name)
-    db.add(tag)
-    db.commit()
-    db.refresh(tag)
-    return tag
-
-def update_note_tags(
-        db: Session, 
+async def get_tags_by_names(
+        db: AsyncSession,
+        tag_names: Sequence[str],
+        ) -> List[Tag]:
+    tags = []
+    for names in batched(tag_names):
+        result = await db.execute(select(Tag).filter(Tag.name.in_(names)))
+        tags.extend(result.scalars().all())
+    return tags
+
+async def get_or_create_tags(
+        db: AsyncSession, 
+        tag_names: Iterable[str],
+        ) -> List[Tag]:
+    tag_names = sorted(set(tag_names))
+    if not tag_names:
+        return []
+    tags = await get_tags_by_names(db, tag_names)
+    missing = set(tag_names) - {tag.name for tag in tags}
+    if missing:
+        # ON CONFLICT не возвращает строки, вставленные параллельным запросом,
+        # поэтому их дочитываем отдельно. Имена вставляются в одном порядке во всех
+        # процессах, иначе пересекающиеся вставки взаимно блокируются на tags.name
+        result = await db.execute(
+            pg_insert(Tag)
+            .on_conflict_do_nothing(index_elements=[Tag.name])
+            .returning(Tag),
+            [{"name": name} for name in sorted(missing)],
+            )
+        tags.extend(result.scalars().all())
+        missing -= {tag.name for tag in tags}
+    if missing:
+        tags.extend(await get_tags_by_names(db, sorted(missing)))
+    return tags
+
+async def update_note_tags(
+        db: AsyncSession, 
         db_note: Note, 
         new_tags: set,
         ):
-    existing_tags = {tag.name for tag in db_note.tags}
-    tags_to_add = new_tags - existing_tags
-    tags_to_remove = existing_tags - new_tags
-
-    for tag_name in tags_to_remove:
-        tag = get_tag_by_name(db, tag_name)
-        if tag:
-            db_note.tags.remove(tag)
-
-    for tag_name in tags_to_add:
-        tag = get_tag_by_name(db, tag_name)
-        if not tag:
-            tag = create_tag(db, tag_name)
-        db_note.tags.append(tag)
-
-    db.commit()
-    db.refresh(db_note)
+    current_tags = {tag.name: tag for tag in db_note.tags}
+    tags_to_remove = [tag.id for name, tag in current_tags.items() if name not in new_tags]
+    tags_to_add = await get_or_create_tags(db, new_tags - current_tags.keys())
+
+    if tags_to_remove:
+        await db.execute(
+            delete(note_tags).where(
+                note_tags.c.note_id == db_note.id,
+                note_tags.c.tag_id.in_(tags_to_remove),
+                )
+            )
+    if tags_to_add:
+        await db.execute(
+            insert(note_tags).values([
+                {"note_id": db_note.id, "tag_id": tag.id} for tag in tags_to_add
+                ])
+            )
+    deltas = {tag_id: -1 for tag_id in tags_to_remove}
+    deltas.update({tag.id: 1 for tag in tags_to_add})
+    await adjust_user_tag_counts(
+        db=db,
+        user_id=db_note.user_id,
+        deltas=deltas,
+        )
+    # Связи изменены напрямую в note_tags, синхронизируем загруженную коллекцию без запроса
+    set_committed_value(
+        db_note,
+        "tags",
+        [tag for name, tag in current_tags.items() if name in new_tags] + tags_to_add,
+        )
     return db_note
 
-def search_notes_by_tag(
-        db: Session, 
-        user_id: int, 
-        tag: str,
+async def adjust_user_tag_counts(
+        db: AsyncSession,
+        user_id: int,
+        deltas: Dict[int, int],
         ):
-    return db.execute(
-        select(Note).join(Note.tags).filter(
+    # Строки вставляются в порядке tag_id, чтобы параллельные транзакции не ловили deadlock
+    rows = [
+        {"user_id": user_id, "tag_id": tag_id, "note_count": delta}
+        for tag_id, delta in sorted(deltas.items())
+        if delta
+        ]
+    if not rows:
+        return
+    stmt = pg_insert(UserTag)
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[UserTag.user_id, UserTag.tag_id],
+            set_={"note_count": UserTag.note_count + stmt.excluded.note_count},
+            ),
+        rows,
+        )
+    if any(row["note_count"] < 0 for row in rows):
+        await db.execute(
+            delete(UserTag).where(
+                UserTag.user_id == user_id,
+                UserTag.note_count <= 0,
+                )
+            )
+
+async def get_user_tags(
+        db: AsyncSession,
+        user_id: int,
+        limit: int,
+        prefix: Optional[str] = None,
+        ):
+    query = (
+        select(Tag.name, UserTag.note_count)
+        .join(UserTag, UserTag.tag_id == Tag.id)
+        .filter(UserTag.user_id == user_id)
+        )
+    if prefix:
+        query = query.filter(Tag.name.startswith(prefix, autoescape=True))
+    result = await db.execute(
+        query.order_by(UserTag.note_count.desc(), Tag.name).limit(limit)
+        )
+    return result.all()
+
+# Полнотекстовый поиск
+def build_prefix_tsquery(text: str) -> Optional[str]:
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return None
+    return " & ".join(f"{word}:*" for word in words)
+
+async def search_notes_by_text(
+        db: AsyncSession,
+        user_id: int,
+        text: str,
+        limit: int,
+        offset: int = 0,
+        ):
+    tsquery = build_prefix_tsquery(text)
+    if tsquery is None:
+        return []
+    query = func.to_tsquery(FTS_CONFIG, tsquery)
+    rank = func.ts_rank_cd(Note.search_vector, query)
+    result = await db.execute(
+        select(Note)
+        .filter(
             Note.user_id == user_id,
-            Tag.name == tag,
+            Note.search_vector.op("@@")(query),
             )
-    ).scalars().all()
+        .order_by(rank.desc(), Note.id.desc())
+        .limit(limit)
+        .offset(offset)
+        .options(selectinload(Note.tags))
+        )
+    return result.scalars().all()
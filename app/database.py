@@ -1,20 +1,104 @@
-from sqlalchemy import create_engine
+import logging
+import time
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import (AsyncSession,
+                                    async_sessionmaker,
+                                    create_async_engine)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from app.app_config import POSTGRES_CONN
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.app_config import (POSTGRES_CONN,
+                            DB_POOL_SIZE,
+                            DB_MAX_OVERFLOW,
+                            DB_POOL_TIMEOUT,
+                            DB_POOL_RECYCLE,
+                            DB_POOL_PRE_PING,
+                            DB_SLOW_QUERY_MS)
+from app.db_stats import db_stats
+from app.metrics import DB_QUERY_LATENCY, callback_metrics, request_db_stats
 
+logger = logging.getLogger("notes_api")
 
 
-engine = create_engine(POSTGRES_CONN)
-SessionLocal = sessionmaker(
-    autocommit=False, 
-    autoflush=False, 
+# Пул, который замеряет время ожидания свободного соединения
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_stats.record_wait(time.perf_counter() - start)
+
+
+engine = create_async_engine(
+    POSTGRES_CONN,
+    poolclass=InstrumentedQueuePool,
+    pool_size=int(DB_POOL_SIZE),
+    max_overflow=int(DB_MAX_OVERFLOW),
+    pool_timeout=float(DB_POOL_TIMEOUT),
+    pool_recycle=int(DB_POOL_RECYCLE),
+    pool_pre_ping=DB_POOL_PRE_PING,
+    )
+SessionLocal = async_sessionmaker(
     bind=engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
     )
 Base = declarative_base()
-def get_db():
-    db = SessionLocal()
-    try:
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    db_stats.record_query(statement, elapsed)
+    DB_QUERY_LATENCY.labels(statement.split(None, 1)[0].upper()).observe(elapsed)
+    request_stats = request_db_stats.get()
+    if request_stats is not None:
+        request_stats.record(elapsed)
+    if elapsed * 1000 > float(DB_SLOW_QUERY_MS):
+        logger.warning("Slow query (%.1f ms): %s", elapsed * 1000, statement)
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def handle_error(exception_context):
+    # after_cursor_execute не вызывается при ошибке, убираем незакрытый замер
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start_time"):
+        conn.info["query_start_time"].pop()
+
+def get_pool_status() -> dict:
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "max_overflow": int(DB_MAX_OVERFLOW),
+        }
+
+callback_metrics.gauge(
+    "db_pool_checked_out",
+    "Connections currently checked out of the pool",
+    lambda: engine.pool.checkedout(),
+    )
+callback_metrics.gauge(
+    "db_pool_idle",
+    "Idle connections in the pool",
+    lambda: engine.pool.checkedin(),
+    )
+callback_metrics.gauge(
+    "db_pool_overflow",
+    "Overflow connections currently open",
+    lambda: engine.pool.overflow(),
+    )
+callback_metrics.counter(
+    "db_connection_wait_seconds",
+    "Total time spent waiting for a pooled connection",
+    lambda: db_stats.connection_wait.total,
+    )
+
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
@@ -0,0 +1,69 @@
+from typing import Dict
+
+
+class TimingStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, elapsed: float):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 3),
+            "avg_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+            }
+
+
+class DBStats:
+    # Ограничение на число различных запросов, чтобы статистика не росла бесконечно
+    max_statements = 200
+
+    def __init__(self):
+        self.connection_wait = TimingStats()
+        self.queries = TimingStats()
+        self.statements: Dict[str, TimingStats] = {}
+
+    def record_wait(self, elapsed: float):
+        self.connection_wait.record(elapsed)
+
+    def record_query(
+            self,
+            statement: str,
+            elapsed: float,
+            ):
+        self.queries.record(elapsed)
+        stats = self.statements.get(statement)
+        if stats is None:
+            if len(self.statements) >= self.max_statements:
+                return
+            stats = self.statements[statement] = TimingStats()
+        stats.record(elapsed)
+
+    def to_dict(
+            self,
+            top: int = 20,
+            ) -> dict:
+        slowest = sorted(
+            self.statements.items(),
+            key=lambda item: item[1].total,
+            reverse=True,
+            )[:top]
+        return {
+            "connection_wait": self.connection_wait.to_dict(),
+            "queries": self.queries.to_dict(),
+            "statements": [
+                {"statement": statement, **stats.to_dict()}
+                for statement, stats in slowest
+                ],
+            }
+
+
+db_stats = DBStats()
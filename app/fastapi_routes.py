@@ -1,54 +1,179 @@
-import logging
-from logging.handlers import TimedRotatingFileHandler
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, List, Optional, Tuple, Union
 from datetime import timedelta
 from app.crud import (create_note, 
-                      update_note_tags, 
                       get_notes, 
                       get_note_by_id, 
                       delete_note, 
                       create_user, 
                       get_user_by_username, 
+                      update_user_password_hash,
                       update_note, 
-                      search_notes_by_tag)
+                      bulk_create_notes,
+                      bulk_update_notes,
+                      bulk_delete_notes,
+                      stream_notes,
+                      search_notes_by_text,
+                      get_user_tags,
+                      get_notes_version,
+                      get_note_changes,
+                      issue_refresh_token,
+                      rotate_refresh_token,
+                      revoke_refresh_token)
 from app.schemas import (NoteCreate, 
                          NoteInDB, 
+                         NoteSummary,
                          NoteUpdate, 
+                         NoteBulkUpdate,
+                         NoteIds,
+                         BulkItemResult,
+                         BulkResult,
+                         TagCount,
+                         NoteChanges,
+                         note_adapter,
+                         note_list_adapter,
+                         note_summary_list_adapter,
                          UserCreate, 
                          Token, 
+                         RefreshRequest,
                          User)
-from app.database import get_db
+from app.database import get_db, get_pool_status, SessionLocal
+from app.db_stats import db_stats
 from app.auth import (get_current_user, 
                       oauth2_scheme, 
                       create_access_token, 
-                      verify_password)
-from app.app_config import ACCESS_TOKEN_EXPIRE_MINUTES
+                      verify_password,
+                      require_stats_token,
+                      user_cache)
+from app.pagination import encode_cursor, decode_cursor
+from app.tag_query import compile_tag_query, TagQueryError
+from app.response_cache import (build_etag,
+                                etag_matches,
+                                get_cached_response,
+                                set_cached_response)
+from app.app_config import (ACCESS_TOKEN_EXPIRE_MINUTES,
+                            REFRESH_TOKEN_EXPIRE_DAYS,
+                            NOTES_PAGE_DEFAULT_LIMIT,
+                            NOTES_PAGE_MAX_LIMIT,
+                            BULK_MAX_ITEMS,
+                            EXPORT_BATCH_SIZE,
+                            LOG_LEVEL,
+                            LOG_INFO_SAMPLE_RATE,
+                            LOG_JSON)
+from common.log_config import setup_logging
 
 # Настройка логирования
-logger = logging.getLogger("notes_api")
-logger.setLevel(logging.INFO)
-handler = TimedRotatingFileHandler("logs/notes_api.log", when="midnight", interval=1, backupCount=7)
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
+logger = setup_logging(
+    name="notes_api",
+    filename="logs/notes_api.log",
+    level=LOG_LEVEL,
+    sample_rate=float(LOG_INFO_SAMPLE_RATE),
+    json_format=LOG_JSON,
+    )
 
 router = APIRouter(
     tags=["notes"],
+    default_response_class=ORJSONResponse,
 )
 
+def validate_bulk_items(
+        items: List[Any],
+        schema,
+        ):
+    if len(items) > int(BULK_MAX_ITEMS):
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Too many items, at most {BULK_MAX_ITEMS} per request",
+            )
+    results = [None] * len(items)
+    valid_items = []
+    for index, item in enumerate(items):
+        try:
+            valid_items.append((index, schema.model_validate(item)))
+        except ValidationError as exc:
+            results[index] = BulkItemResult(
+                index=index,
+                status="error",
+                error="; ".join(
+                    f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}"
+                    for error in exc.errors()
+                    ),
+                )
+    return results, valid_items
+
+def parse_cursor(cursor: Optional[str]):
+    if not cursor:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+            )
+
+def paginate(
+        notes: list,
+        limit: int,
+        ) -> Tuple[list, Optional[str]]:
+    if len(notes) <= limit:
+        return notes, None
+    notes = notes[:limit]
+    return notes, encode_cursor(
+        updated_at=notes[-1].updated_at,
+        note_id=notes[-1].id,
+        )
+
+def issue_access_token(user) -> dict:
+    access_token_expires = timedelta(minutes=int(ACCESS_TOKEN_EXPIRE_MINUTES))
+    access_token = create_access_token(
+        data={
+            "sub": user.username,
+            "uid": user.id,
+            },
+        expires_delta=access_token_expires,
+        )
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "expires_in": int(access_token_expires.total_seconds()),
+        }
+
+def render_json(
+        adapter: TypeAdapter,
+        data,
+        ) -> bytes:
+    return adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+
+def json_response(
+        body: bytes,
+        etag: str,
+        next_cursor: Optional[str] = None,
+        ) -> Response:
+    headers = {"ETag": etag}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers=headers,
+        )
+
 @router.post(
         "/notes/", 
         response_model=NoteInDB,
         )
 async def create_note_endpoint(
     note: NoteCreate, 
-    db: Session = Depends(get_db), 
+    db: AsyncSession = Depends(get_db), 
     token: str = Depends(oauth2_scheme),
     ):
-    user = get_current_user(
+    user = await get_current_user(
         token=token, 
         db=db,
         )
@@ -59,29 +184,32 @@ async def create_note_endpoint(
             detail="Invalid credentials",
             )
     
-    db_note = create_note(
+    db_note = await create_note(
         db=db, 
         note=note, 
         user_id=user.id,
         )
-    update_note_tags(
-        db=db, 
-        db_note=db_note, 
-        new_tags=set(note.tags),
-        )
-    logger.info(f"Note created successfully: {db_note.id}")
+    logger.info("Note created successfully: %s", db_note.id)
     return db_note
 
 @router.get(
         "/notes/", 
-        response_model=List[NoteInDB],
+        response_model=List[Union[NoteInDB, NoteSummary]],
         )
 async def read_notes_endpoint(
+    request: Request,
     tag: Optional[str] = None, 
-    db: Session = Depends(get_db), 
+    limit: int = Query(
+        default=int(NOTES_PAGE_DEFAULT_LIMIT),
+        ge=1,
+        le=int(NOTES_PAGE_MAX_LIMIT),
+        ),
+    cursor: Optional[str] = None,
+    summary: bool = False,
+    db: AsyncSession = Depends(get_db), 
     token: str = Depends(oauth2_scheme),
     ):
-    user = get_current_user(
+    user = await get_current_user(
         token=token, 
         db=db,
         )
@@ -91,21 +219,252 @@ async def read_notes_endpoint(
             status_code=status.HTTP_401_UNAUTHORIZED, 
             detail="Invalid credentials",
             )
-    
-    notes = get_notes(
+
+    # 304 и ответ из кэша отдаются без обращения к таблице notes
+    version = await get_notes_version(
+        db=db,
+        user_id=user.id,
+        )
+    etag = build_etag(
+        user_id=user.id,
+        version=version,
+        resource=f"notes?{request.url.query}",
+        )
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={"ETag": etag},
+            )
+    cached = await get_cached_response(
+        user_id=user.id,
+        etag=etag,
+        )
+    if cached:
+        body, next_cursor = cached
+        return json_response(body, etag, next_cursor)
+
+    # Запрашиваем на одну запись больше, чтобы понять, есть ли следующая страница
+    notes = await get_notes(
         db=db, 
         user_id=user.id, 
         tag=tag,
+        limit=limit + 1,
+        after=parse_cursor(cursor),
+        summary=summary,
+        )
+    notes, next_cursor = paginate(notes, limit)
+    body = render_json(
+        note_summary_list_adapter if summary else note_list_adapter,
+        notes,
+        )
+    await set_cached_response(
+        user_id=user.id,
+        etag=etag,
+        body=body,
+        next_cursor=next_cursor,
         )
-    if notes is None:
-        logger.info("Tag not found: %s", tag)
+
+    logger.info("Notes retrieved: %s notes found", len(notes))
+    return json_response(body, etag, next_cursor)
+
+@router.post(
+        "/notes/bulk",
+        response_model=BulkResult,
+        )
+async def bulk_create_notes_endpoint(
+    items: List[Any] = Body(...),
+    db: AsyncSession = Depends(get_db),
+    token: str = Depends(oauth2_scheme),
+    ):
+    user = await get_current_user(
+        token=token,
+        db=db,
+        )
+    if not user:
+        logger.warning("Unauthorized access attempt")
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, 
-            detail="Tag not found",
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid credentials",
             )
-    
-    logger.info(f"Notes retrieved: {len(notes)} notes found")
-    return notes
+
+    results, valid_items = validate_bulk_items(items, NoteCreate)
+    note_ids = await bulk_create_notes(
+        db=db,
+        notes=[note for _, note in valid_items],
+        user_id=user.id,
+        )
+    for (index, _), note_id in zip(valid_items, note_ids):
+        results[index] = BulkItemResult(
+            index=index,
+            id=note_id,
+            status="created",
+            )
+    logger.info("Bulk create: %d of %d notes created", len(note_ids), len(items))
+    return {"results": results}
+
+@router.put(
+        "/notes/bulk",
+        response_model=BulkResult,
+        )
+async def bulk_update_notes_endpoint(
+    items: List[Any] = Body(...),
+    db: AsyncSession = Depends(get_db),
+    token: str = Depends(oauth2_scheme),
+    ):
+    user = await get_current_user(
+        token=token,
+        db=db,
+        )
+    if not user:
+        logger.warning("Unauthorized access attempt")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid credentials",
+            )
+
+    results, valid_items = validate_bulk_items(items, NoteBulkUpdate)
+    seen_ids = set()
+    unique_items = []
+    for index, item in valid_items:
+        if item.id in seen_ids:
+            results[index] = BulkItemResult(
+                index=index,
+                id=item.id,
+                status="error",
+                error="Duplicate note id in batch",
+                )
+            continue
+        seen_ids.add(item.id)
+        unique_items.append((index, item))
+
+    updated_ids = set(await bulk_update_notes(
+        db=db,
+        updates=[item for _, item in unique_items],
+        user_id=user.id,
+        ))
+    for index, item in unique_items:
+        results[index] = BulkItemResult(
+            index=index,
+            id=item.id,
+            status="updated" if item.id in updated_ids else "not_found",
+            )
+    logger.info("Bulk update: %d of %d notes updated", len(updated_ids), len(items))
+    return {"results": results}
+
+@router.post(
+        "/notes/bulk/delete",
+        response_model=BulkResult,
+        )
+async def bulk_delete_notes_endpoint(
+    note_ids: NoteIds,
+    db: AsyncSession = Depends(get_db),
+    token: str = Depends(oauth2_scheme),
+    ):
+    user = await get_current_user(
+        token=token,
+        db=db,
+        )
+    if not user:
+        logger.warning("Unauthorized access attempt")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid credentials",
+            )
+    if len(note_ids.ids) > int(BULK_MAX_ITEMS):
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Too many items, at most {BULK_MAX_ITEMS} per request",
+            )
+
+    deleted_ids = set(await bulk_delete_notes(
+        db=db,
+        note_ids=note_ids.ids,
+        user_id=user.id,
+        ))
+    results = [
+        BulkItemResult(
+            index=index,
+            id=note_id,
+            status="deleted" if note_id in deleted_ids else "not_found",
+            )
+        for index, note_id in enumerate(note_ids.ids)
+        ]
+    logger.info("Bulk delete: %d of %d notes deleted", len(deleted_ids), len(note_ids.ids))
+    return {"results": results}
+
+@router.get(
+        "/notes/changes",
+        response_model=NoteChanges,
+        )
+async def read_note_changes_endpoint(
+    since: int = Query(
+        default=0,
+        ge=0,
+        ),
+    limit: int = Query(
+        default=int(NOTES_PAGE_DEFAULT_LIMIT),
+        ge=1,
+        le=int(NOTES_PAGE_MAX_LIMIT),
+        ),
+    db: AsyncSession = Depends(get_db),
+    token: str = Depends(oauth2_scheme),
+    ):
+    user = await get_current_user(
+        token=token,
+        db=db,
+        )
+    if not user:
+        logger.warning("Unauthorized access attempt")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid credentials",
+            )
+
+    notes, tombstones, cursor, has_more = await get_note_changes(
+        db=db,
+        user_id=user.id,
+        since=since,
+        limit=limit,
+        )
+    logger.info("Changes since %s: %s updated, %s deleted", since, len(notes), len(tombstones))
+    return {
+        "notes": notes,
+        "deleted": [tombstone.note_id for tombstone in tombstones],
+        "cursor": cursor,
+        "has_more": has_more,
+        }
+
+@router.get("/notes/export")
+async def export_notes_endpoint(
+    db: AsyncSession = Depends(get_db),
+    token: str = Depends(oauth2_scheme),
+    ):
+    user = await get_current_user(
+        token=token,
+        db=db,
+        )
+    if not user:
+        logger.warning("Unauthorized access attempt")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid credentials",
+            )
+
+    # Сессия зависимости закрывается до отправки ответа, поэтому поток читает в своей
+    async def generate_ndjson():
+        async with SessionLocal() as export_db:
+            async for note in stream_notes(
+                db=export_db,
+                user_id=user.id,
+                batch_size=int(EXPORT_BATCH_SIZE),
+                ):
+                yield NoteInDB.model_validate(note).model_dump_json() + "\n"
+
+    logger.info("Notes export started for user: %s", user.id)
+    return StreamingResponse(
+        generate_ndjson(),
+        media_type="application/x-ndjson",
+        )
 
 @router.get(
         "/notes/{note_id}", 
@@ -113,10 +472,11 @@ async def read_notes_endpoint(
         )
 async def read_note_endpoint(
     note_id: int, 
-    db: Session = Depends(get_db), 
+    request: Request,
+    db: AsyncSession = Depends(get_db), 
     token: str = Depends(oauth2_scheme),
     ):
-    user = get_current_user(
+    user = await get_current_user(
         token=token, 
         db=db,
         )
@@ -126,21 +486,48 @@ async def read_note_endpoint(
             status_code=status.HTTP_401_UNAUTHORIZED, 
             detail="Invalid credentials",
             )
+
+    version = await get_notes_version(
+        db=db,
+        user_id=user.id,
+        )
+    etag = build_etag(
+        user_id=user.id,
+        version=version,
+        resource=f"notes/{note_id}",
+        )
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={"ETag": etag},
+            )
+    cached = await get_cached_response(
+        user_id=user.id,
+        etag=etag,
+        )
+    if cached:
+        return json_response(cached[0], etag)
     
-    note = get_note_by_id(
+    note = await get_note_by_id(
         db=db, 
         note_id=note_id, 
         user_id=user.id,
         )
     if not note:
-        logger.info(f"Note not found: {note_id}")
+        logger.info("Note not found: %s", note_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, 
             detail="Note not found",
             )
+    body = render_json(note_adapter, note)
+    await set_cached_response(
+        user_id=user.id,
+        etag=etag,
+        body=body,
+        )
     
-    logger.info(f"Note retrieved: {note_id}")
-    return note
+    logger.info("Note retrieved: %s", note_id)
+    return json_response(body, etag)
 
 @router.put(
         "/notes/{note_id}", 
@@ -149,10 +536,10 @@ async def read_note_endpoint(
 async def update_note_endpoint(
     note_id: int, 
     note_update: NoteUpdate, 
-    db: Session = Depends(get_db), 
+    db: AsyncSession = Depends(get_db), 
     token: str = Depends(oauth2_scheme),
     ):
-    user = get_current_user(
+    user = await get_current_user(
         token=token, 
         db=db,
         )
@@ -163,38 +550,33 @@ async def update_note_endpoint(
             detail="Invalid credentials",
             )
 
-    db_note = get_note_by_id(
+    db_note = await get_note_by_id(
         db=db, 
         note_id=note_id, 
         user_id=user.id,
         )
     if not db_note:
-        logger.info(f"Note not found: {note_id}")
+        logger.info("Note not found: %s", note_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, 
             detail="Note not found",
             )
 
-    db_note = update_note(
+    db_note = await update_note(
         db=db, 
         db_note=db_note, 
         note_update=note_update,
         )
-    update_note_tags(
-        db=db, 
-        db_note=db_note, 
-        new_tags=set(note_update.tags),
-        )
-    logger.info(f"Note updated: {note_id}")
+    logger.info("Note updated: %s", note_id)
     return db_note
 
 @router.delete("/notes/{note_id}")
 async def delete_note_endpoint(
     note_id: int, 
-    db: Session = Depends(get_db), 
+    db: AsyncSession = Depends(get_db), 
     token: str = Depends(oauth2_scheme),
     ):
-    user = get_current_user(
+    user = await get_current_user(
         token=token, 
         db=db,
         )
@@ -205,23 +587,23 @@ async def delete_note_endpoint(
             detail="Invalid credentials",
             )
 
-    db_note = get_note_by_id(
+    db_note = await get_note_by_id(
         db=db, 
         note_id=note_id, 
         user_id=user.id,
         )
     if not db_note:
-        logger.info(f"Note not found: {note_id}")
+        logger.info("Note not found: %s", note_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, 
             detail="Note not found",
             )
 
-    delete_note(
+    await delete_note(
         db=db,
         db_note=db_note,
         )
-    logger.info(f"Note deleted: {note_id}")
+    logger.info("Note deleted: %s", note_id)
     return {"message": f"Note id:{note_id} deleted successfully"}
 
 @router.post(
@@ -230,57 +612,117 @@ async def delete_note_endpoint(
         )
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     ):
-    user = get_user_by_username(
+    user = await get_user_by_username(
         db=db, 
         username=form_data.username,
         )
-    if not user or not verify_password(
-        plain_password=form_data.password, 
-        hashed_password=user.hashed_password,
-        ):
+    password_valid, new_hash = False, None
+    if user:
+        password_valid, new_hash = await verify_password(
+            plain_password=form_data.password, 
+            hashed_password=user.hashed_password,
+            )
+    if not password_valid:
         logger.warning("Invalid credentials for user: %s", form_data.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, 
             detail="Incorrect username or password", 
             headers={"WWW-Authenticate": "Bearer"},
             )
+    if new_hash:
+        await update_user_password_hash(
+            db=db,
+            db_user=user,
+            hashed_password=new_hash,
+            )
     
-    access_token_expires = timedelta(minutes=int(ACCESS_TOKEN_EXPIRE_MINUTES))
-    access_token = create_access_token(
-        data={"sub": user.username}, 
-        expires_delta=access_token_expires,
+    logger.info("User logged in: %s", form_data.username)
+    return {
+        **issue_access_token(user),
+        "refresh_token": await issue_refresh_token(
+            db=db,
+            user_id=user.id,
+            ),
+        "refresh_expires_in": int(REFRESH_TOKEN_EXPIRE_DAYS) * 86400,
+        }
+
+@router.post(
+        "/token/refresh",
+        response_model=Token,
         )
-    logger.info(f"User logged in: {form_data.username}")
+async def refresh_access_token(
+    refresh_request: RefreshRequest,
+    db: AsyncSession = Depends(get_db),
+    ):
+    user, refresh_token, reused = await rotate_refresh_token(
+        db=db,
+        token=refresh_request.refresh_token,
+        )
+    if reused:
+        logger.warning("Reused refresh token, session revoked")
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+            )
+    logger.info("Token refreshed for user: %s", user.username)
     return {
-        "access_token": access_token, 
-        "token_type": "bearer",
+        **issue_access_token(user),
+        "refresh_token": refresh_token,
+        "refresh_expires_in": int(REFRESH_TOKEN_EXPIRE_DAYS) * 86400,
         }
 
+@router.post("/token/revoke")
+async def revoke_token(
+    refresh_request: RefreshRequest,
+    db: AsyncSession = Depends(get_db),
+    ):
+    await revoke_refresh_token(
+        db=db,
+        token=refresh_request.refresh_token,
+        )
+    return {"message": "Token revoked"}
+
 @router.post(
         "/users/", 
         response_model=User,
         )
 async def create_user_endpoint(
     user: UserCreate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     ):
-    created_user = create_user(
+    created_user = await create_user(
         db=db, 
         user=user,
         )
-    logger.info(f"User created: {created_user.username}")
+    logger.info("User created: %s", created_user.username)
     return created_user
 
 
-@router.get("/search")
+@router.get(
+        "/search",
+        response_model=List[NoteInDB],
+        )
 async def search_notes(
-    tag: str, 
+    response: Response,
+    tag: Optional[str] = None, 
+    q: Optional[str] = Query(
+        default=None,
+        max_length=1024,
+        ),
+    limit: int = Query(
+        default=int(NOTES_PAGE_DEFAULT_LIMIT),
+        ge=1,
+        le=int(NOTES_PAGE_MAX_LIMIT),
+        ),
+    cursor: Optional[str] = None,
     token: str = Depends(oauth2_scheme), 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     ):
-    user = get_current_user(
+    user = await get_current_user(
         token=token, 
         db=db,
         )
@@ -290,16 +732,168 @@ async def search_notes(
             status_code=status.HTTP_401_UNAUTHORIZED, 
             detail="Invalid credentials",
             )
-    notes = search_notes_by_tag(
+    if not tag and not q:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Either tag or q must be provided",
+            )
+    tag_filter = None
+    if q:
+        try:
+            tag_filter = compile_tag_query(q)
+        except TagQueryError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid tag expression: {exc}",
+                )
+
+    notes = await get_notes(
         db=db, 
         user_id=user.id, 
         tag=tag,
+        tag_filter=tag_filter,
+        limit=limit + 1,
+        after=parse_cursor(cursor),
         )
+    notes, next_cursor = paginate(notes, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     if not notes:
-        logger.info(f"No notes found for tag: {tag}")
+        logger.info("No notes found for tag: %s", tag or q)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, 
             detail="No notes found for the given tag",
             )
-    logger.info(f"Notes found for tag: {tag}")
+    logger.info("Notes found for tag: %s", tag or q)
+    return notes
+
+
+@router.get(
+        "/search/text",
+        response_model=List[NoteInDB],
+        )
+async def search_notes_text(
+    q: str = Query(
+        min_length=1,
+        max_length=256,
+        ),
+    limit: int = Query(
+        default=int(NOTES_PAGE_DEFAULT_LIMIT),
+        ge=1,
+        le=int(NOTES_PAGE_MAX_LIMIT),
+        ),
+    offset: int = Query(
+        default=0,
+        ge=0,
+        ),
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db),
+    ):
+    user = await get_current_user(
+        token=token,
+        db=db,
+        )
+    if not user:
+        logger.warning("Unauthorized access attempt")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid credentials",
+            )
+    notes = await search_notes_by_text(
+        db=db,
+        user_id=user.id,
+        text=q,
+        limit=limit,
+        offset=offset,
+        )
+    logger.info("Text search: %s notes found", len(notes))
     return notes
+
+@router.get(
+        "/tags",
+        response_model=List[TagCount],
+        )
+async def read_tags(
+    limit: int = Query(
+        default=100,
+        ge=1,
+        le=int(NOTES_PAGE_MAX_LIMIT),
+        ),
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db),
+    ):
+    user = await get_current_user(
+        token=token,
+        db=db,
+        )
+    if not user:
+        logger.warning("Unauthorized access attempt")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid credentials",
+            )
+    tags = await get_user_tags(
+        db=db,
+        user_id=user.id,
+        limit=limit,
+        )
+    logger.info("Tags retrieved: %s tags found", len(tags))
+    return tags
+
+@router.get(
+        "/tags/autocomplete",
+        response_model=List[TagCount],
+        )
+async def autocomplete_tags(
+    prefix: str = Query(
+        min_length=1,
+        max_length=128,
+        ),
+    limit: int = Query(
+        default=10,
+        ge=1,
+        le=50,
+        ),
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db),
+    ):
+    user = await get_current_user(
+        token=token,
+        db=db,
+        )
+    if not user:
+        logger.warning("Unauthorized access attempt")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid credentials",
+            )
+    return await get_user_tags(
+        db=db,
+        user_id=user.id,
+        limit=limit,
+        prefix=prefix,
+        )
+
+@router.get(
+        "/stats/auth_cache",
+        dependencies=[Depends(require_stats_token)],
+        )
+async def auth_cache_stats():
+    return user_cache.stats()
+
+@router.get(
+        "/stats/db",
+        dependencies=[Depends(require_stats_token)],
+        )
+async def db_pool_stats():
+    return {
+        "pool": get_pool_status(),
+        **db_stats.to_dict(),
+        }
+
+@router.get("/metrics")
+async def prometheus_metrics():
+    return Response(
+        content=generate_latest(),
+        media_type=CONTENT_TYPE_LATEST,
+        )
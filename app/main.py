@@ -1,10 +1,47 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI
 from app.fastapi_routes import router
 from app.models import Base
-from app.database import engine
+from app.database import SessionLocal, engine
+from app.crud import purge_refresh_tokens
+from app.auth import hash_executor
+from app.metrics import MetricsMiddleware
+from app.request_id import RequestIdMiddleware
+from app.rate_limit import RateLimitMiddleware
+from app.app_config import REFRESH_TOKEN_PURGE_INTERVAL_SECONDS
 
-Base.metadata.create_all(bind=engine)
+logger = logging.getLogger("notes_api")
 
-app = FastAPI()
+
+async def purge_refresh_tokens_periodically():
+    # Каждое обновление токена добавляет строку, без очистки таблица растёт бесконечно
+    while True:
+        try:
+            async with SessionLocal() as db:
+                purged = await purge_refresh_tokens(db)
+            if purged:
+                logger.info("Purged %s expired refresh tokens", purged)
+        except Exception:
+            logger.exception("Refresh token purge failed")
+        await asyncio.sleep(int(REFRESH_TOKEN_PURGE_INTERVAL_SECONDS))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    purge_task = asyncio.create_task(purge_refresh_tokens_periodically())
+    yield
+    purge_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await purge_task
+    await engine.dispose()
+    hash_executor.shutdown(wait=False)
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(RateLimitMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestIdMiddleware)
 app.include_router(router)
 
@@ -0,0 +1,117 @@
+import time
+from contextvars import ContextVar
+from typing import Callable, List, Optional, Tuple
+from prometheus_client import Counter, Histogram, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+REQUEST_COUNT = Counter(
+    "http_requests_total",
+    "HTTP requests by route and status",
+    ["method", "route", "status"],
+    )
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route and status",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    )
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request",
+    "SQL statements executed per HTTP request",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+    )
+DB_TIME_PER_REQUEST = Histogram(
+    "db_time_per_request_seconds",
+    "Time spent in SQL statements per HTTP request",
+    ["route"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+    )
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds",
+    "SQL statement latency by operation",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+    )
+
+
+class RequestDBStats:
+    __slots__ = ("queries", "time")
+
+    def __init__(self):
+        self.queries = 0
+        self.time = 0.0
+
+    def record(self, elapsed: float):
+        self.queries += 1
+        self.time += elapsed
+
+
+# Статистика запросов к БД в рамках текущего HTTP-запроса
+request_db_stats: ContextVar[Optional[RequestDBStats]] = ContextVar("request_db_stats", default=None)
+
+
+# Метрики, значения которых читаются в момент сбора (кэш, пулы)
+class CallbackCollector:
+    def __init__(self):
+        self._counters: List[Tuple[str, str, Callable[[], float]]] = []
+        self._gauges: List[Tuple[str, str, Callable[[], float]]] = []
+
+    def counter(
+            self,
+            name: str,
+            documentation: str,
+            callback: Callable[[], float],
+            ):
+        self._counters.append((name, documentation, callback))
+
+    def gauge(
+            self,
+            name: str,
+            documentation: str,
+            callback: Callable[[], float],
+            ):
+        self._gauges.append((name, documentation, callback))
+
+    def collect(self):
+        for name, documentation, callback in self._counters:
+            yield CounterMetricFamily(name, documentation, value=callback())
+        for name, documentation, callback in self._gauges:
+            yield GaugeMetricFamily(name, documentation, value=callback())
+
+
+callback_metrics = CallbackCollector()
+REGISTRY.register(callback_metrics)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        db_stats = RequestDBStats()
+        token = request_db_stats.set(db_stats)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            request_db_stats.reset(token)
+            # Шаблон пути, а не сам путь, чтобы число серий не зависело от id заметок
+            route = getattr(scope.get("route"), "path", "unmatched")
+            labels = (scope["method"], route, str(status_code))
+            REQUEST_COUNT.labels(*labels).inc()
+            REQUEST_LATENCY.labels(*labels).observe(elapsed)
+            DB_QUERIES_PER_REQUEST.labels(route).observe(db_stats.queries)
+            DB_TIME_PER_REQUEST.labels(route).observe(db_stats.time)
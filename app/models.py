@@ -4,10 +4,23 @@ from sqlalchemy import (Column,
                         Text, 
                         ForeignKey, 
                         Table, 
-                        DateTime)
-from sqlalchemy.orm import relationship
+                        DateTime,
+                        Index,
+                        Computed,
+                        PrimaryKeyConstraint,
+                        BigInteger,
+                        Sequence)
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from app.database import Base
+from app.app_config import FTS_CONFIG
+
+# Общая монотонная последовательность изменений для синхронизации клиентов
+note_change_seq = Sequence(
+    'note_change_seq',
+    metadata=Base.metadata,
+    )
 
 note_tags = Table(
     'note_tags',
@@ -21,7 +34,16 @@ note_tags = Table(
         'tag_id', 
         Integer, 
         ForeignKey('tags.id'),
-        )
+        ),
+    # PK (tag_id, note_id) обслуживает поиск по тегам, индекс по note_id - загрузку тегов заметки
+    PrimaryKeyConstraint(
+        'tag_id',
+        'note_id',
+        ),
+    Index(
+        'ix_note_tags_note_id',
+        'note_id',
+        ),
 )
 
 class User(Base):
@@ -37,9 +59,36 @@ class User(Base):
         index=True,
         )
     hashed_password = Column(String)
+    notes_version = Column(
+        Integer,
+        nullable=False,
+        default=0,
+        server_default='0',
+        )
 
 class Note(Base):
     __tablename__ = 'notes'
+    __table_args__ = (
+        Index(
+            'ix_notes_user_id_updated_at_id',
+            'user_id',
+            'updated_at',
+            'id',
+            ),
+        Index(
+            'ix_notes_search_vector',
+            'search_vector',
+            postgresql_using='gin',
+            ),
+        Index(
+            'ix_notes_user_id_change_seq',
+            'user_id',
+            'change_seq',
+            ),
+        )
+    __mapper_args__ = {
+        'eager_defaults': True,
+        }
     id = Column(
         Integer, 
         primary_key=True, 
@@ -63,6 +112,23 @@ class Note(Base):
         Integer, 
         ForeignKey('users.id'),
         )
+    change_seq = Column(
+        BigInteger,
+        default=note_change_seq.next_value(),
+        onupdate=note_change_seq.next_value(),
+        )
+    # Поддерживается самим Postgres при каждой записи, заголовок весит больше содержимого
+    search_vector = deferred(
+        Column(
+            TSVECTOR,
+            Computed(
+                f"setweight(to_tsvector('{FTS_CONFIG}', coalesce(title, '')), 'A') || "
+                f"setweight(to_tsvector('{FTS_CONFIG}', coalesce(content, '')), 'B')",
+                persisted=True,
+                ),
+            ),
+        raiseload=True,
+        )
 
     user = relationship('User')
     tags = relationship(
@@ -89,3 +155,87 @@ class Tag(Base):
         secondary=note_tags, 
         back_populates='tags',
         )
+
+# Следы удалённых заметок, чтобы клиенты синхронизации узнавали об удалении
+class NoteTombstone(Base):
+    __tablename__ = 'note_tombstones'
+    __table_args__ = (
+        Index(
+            'ix_note_tombstones_user_id_change_seq',
+            'user_id',
+            'change_seq',
+            ),
+        )
+    note_id = Column(
+        Integer,
+        primary_key=True,
+        )
+    user_id = Column(
+        Integer,
+        ForeignKey('users.id'),
+        )
+    change_seq = Column(
+        BigInteger,
+        default=note_change_seq.next_value(),
+        )
+    deleted_at = Column(
+        DateTime,
+        default=func.now(),
+        )
+
+# Счётчик заметок по тегу для каждого пользователя, обновляется вместе с note_tags
+class UserTag(Base):
+    __tablename__ = 'user_tags'
+    user_id = Column(
+        Integer,
+        ForeignKey('users.id'),
+        primary_key=True,
+        )
+    tag_id = Column(
+        Integer,
+        ForeignKey('tags.id'),
+        primary_key=True,
+        )
+    note_count = Column(
+        Integer,
+        nullable=False,
+        default=0,
+        )
+
+    tag = relationship('Tag')
+
+# Refresh-токены хранятся только в виде sha256, цепочка ротаций объединена family_id
+class RefreshToken(Base):
+    __tablename__ = 'refresh_tokens'
+    id = Column(
+        Integer,
+        primary_key=True,
+        )
+    user_id = Column(
+        Integer,
+        ForeignKey('users.id'),
+        nullable=False,
+        )
+    family_id = Column(
+        String(32),
+        nullable=False,
+        index=True,
+        )
+    token_hash = Column(
+        String(64),
+        nullable=False,
+        unique=True,
+        )
+    created_at = Column(
+        DateTime,
+        default=func.now(),
+        )
+    expires_at = Column(
+        DateTime,
+        nullable=False,
+        )
+    revoked_at = Column(DateTime)
+    replaced_by = Column(
+        Integer,
+        ForeignKey('refresh_tokens.id'),
+        )
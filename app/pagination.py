@@ -0,0 +1,19 @@
+import base64
+from datetime import datetime
+from typing import Tuple
+
+
+def encode_cursor(
+        updated_at: datetime,
+        note_id: int,
+        ) -> str:
+    raw = f"{updated_at.isoformat()}|{note_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        updated_at, note_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(updated_at), int(note_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
@@ -0,0 +1,207 @@
+import hashlib
+import logging
+import math
+import re
+import secrets
+from urllib.parse import parse_qs
+import orjson
+import redis.asyncio as redis
+from typing import NamedTuple, Optional, Pattern, Tuple
+from jose import JWTError, jwt
+from app.app_config import (REDIS_URL,
+                            SECRET_KEY,
+                            ALGORITHM,
+                            RATE_LIMIT_ENABLED,
+                            RATE_LIMIT_DEFAULT_RPS,
+                            RATE_LIMIT_DEFAULT_BURST,
+                            RATE_LIMIT_LOGIN_PER_MINUTE,
+                            RATE_LIMIT_LOGIN_IP_PER_MINUTE,
+                            RATE_LIMIT_BULK_PER_MINUTE,
+                            RATE_LIMIT_CLIENT_KEY)
+from common.token_bucket import TokenBucketLimiter
+
+logger = logging.getLogger("notes_api")
+
+limiter = TokenBucketLimiter(
+    redis.from_url(REDIS_URL),
+    prefix="ratelimit:api",
+    logger=logger,
+    ) if RATE_LIMIT_ENABLED else None
+
+
+class RateBudget(NamedTuple):
+    name: str
+    method: Optional[str]
+    path: Pattern
+    rate: float
+    burst: float
+    # Чем различаются вёдра: ip, user (id из JWT), login (имя пользователя и IP),
+    # refresh (хэш refresh-токена)
+    key_by: str
+
+
+def _per_minute(value) -> float:
+    return float(value) / 60
+
+# Проверяются по порядку, первый подходящий бюджет применяется к запросу
+ROUTE_BUDGETS = [
+    # /token и /users/ упираются в bcrypt. Вход ограничивается по имени и IP, чтобы пользователи
+    # за одним адресом (например, все пользователи бота) не делили одно ведро
+    RateBudget("login", "POST", re.compile(r"^/token$"),
+               _per_minute(RATE_LIMIT_LOGIN_PER_MINUTE), float(RATE_LIMIT_LOGIN_PER_MINUTE), "login"),
+    RateBudget("signup", "POST", re.compile(r"^/users/$"),
+               _per_minute(RATE_LIMIT_LOGIN_PER_MINUTE), float(RATE_LIMIT_LOGIN_PER_MINUTE), "ip"),
+    RateBudget("token", "POST", re.compile(r"^/token/"),
+               _per_minute(60), 10, "refresh"),
+    RateBudget("bulk", None, re.compile(r"^/notes/bulk"),
+               _per_minute(RATE_LIMIT_BULK_PER_MINUTE), float(RATE_LIMIT_BULK_PER_MINUTE), "user"),
+    RateBudget("export", "GET", re.compile(r"^/notes/export$"),
+               _per_minute(2), 2, "user"),
+    RateBudget("default", None, re.compile(r""),
+               float(RATE_LIMIT_DEFAULT_RPS), float(RATE_LIMIT_DEFAULT_BURST), "user"),
+    ]
+# Потолок на все попытки входа с одного IP, кроме доверенного клиента
+LOGIN_IP_RATE = _per_minute(RATE_LIMIT_LOGIN_IP_PER_MINUTE)
+LOGIN_IP_BURST = float(RATE_LIMIT_LOGIN_IP_PER_MINUTE)
+EXEMPT_PATHS = {"/metrics"}
+
+def match_budget(
+        method: str,
+        path: str,
+        ) -> RateBudget:
+    for budget in ROUTE_BUDGETS:
+        if budget.method in (None, method) and budget.path.match(path):
+            return budget
+    return ROUTE_BUDGETS[-1]
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode()).hexdigest()[:32]
+
+def _is_trusted_client(headers) -> bool:
+    # Доверенный клиент (бот) сам ограничивает своих пользователей и ходит с одного IP
+    if not RATE_LIMIT_CLIENT_KEY:
+        return False
+    for name, value in headers:
+        if name == b"x-client-key":
+            return secrets.compare_digest(value, RATE_LIMIT_CLIENT_KEY.encode())
+    return False
+
+def _content_type(headers) -> str:
+    for name, value in headers:
+        if name == b"content-type":
+            return value.decode("latin-1").split(";", 1)[0].strip().lower()
+    return ""
+
+def _subject_from_body(
+        key_by: str,
+        content_type: str,
+        body: bytes,
+        ) -> Optional[str]:
+    try:
+        if key_by == "login" and content_type == "application/x-www-form-urlencoded":
+            username = parse_qs(body.decode("utf-8")).get("username", [""])[0]
+            return f"name:{_digest(username)}" if username else None
+        if key_by == "refresh" and content_type == "application/json":
+            refresh_token = orjson.loads(body).get("refresh_token")
+            return f"refresh:{_digest(refresh_token)}" if isinstance(refresh_token, str) else None
+    except (UnicodeDecodeError, orjson.JSONDecodeError, AttributeError):
+        return None
+    return None
+
+async def _buffer_body(receive) -> Tuple[bytes, object]:
+    # Тело читается целиком и затем отдаётся приложению заново
+    messages = []
+    body = b""
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+
+    async def replay():
+        if messages:
+            return messages.pop(0)
+        return await receive()
+
+    return body, replay
+
+def _user_id_from_headers(headers) -> Optional[str]:
+    for name, value in headers:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                return None
+            try:
+                payload = jwt.decode(
+                    token,
+                    SECRET_KEY,
+                    algorithms=[ALGORITHM],
+                    )
+            except JWTError:
+                return None
+            user_id = payload.get("uid")
+            return str(user_id) if user_id is not None else None
+    return None
+
+
+class RateLimitMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or limiter is None or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        budget = match_budget(scope["method"], scope["path"])
+        client = scope.get("client")
+        ip = client[0] if client else "unknown"
+        subject = None
+        if budget.key_by == "user":
+            user_id = _user_id_from_headers(scope["headers"])
+            subject = f"user:{user_id}" if user_id else None
+        elif budget.key_by in ("login", "refresh"):
+            body, receive = await _buffer_body(receive)
+            subject = _subject_from_body(budget.key_by, _content_type(scope["headers"]), body)
+            if subject and budget.key_by == "login":
+                subject = f"{subject}:ip:{ip}"
+        trusted = _is_trusted_client(scope["headers"])
+        if subject is None:
+            if trusted:
+                await self.app(scope, receive, send)
+                return
+            subject = f"ip:{ip}"
+        checks = [(f"{budget.name}:{subject}", budget.rate, budget.burst)]
+        # Перебор имён с одного адреса упирается в общий потолок на IP поверх ведра имя+IP
+        if budget.key_by == "login" and subject != f"ip:{ip}" and not trusted:
+            checks.append((f"{budget.name}:ip:{ip}", LOGIN_IP_RATE, LOGIN_IP_BURST))
+
+        for key, rate, burst in checks:
+            allowed, retry_after = await limiter.consume(
+                key,
+                rate=rate,
+                capacity=burst,
+                )
+            if not allowed:
+                break
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        body = orjson.dumps({"detail": "Too many requests"})
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+                ],
+            })
+        await send({
+            "type": "http.response.body",
+            "body": body,
+            })
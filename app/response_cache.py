@@ -0,0 +1,70 @@
+import hashlib
+import logging
+from typing import Optional, Tuple
+import redis.asyncio as redis
+from app.app_config import (REDIS_URL,
+                            RESPONSE_CACHE_ENABLED,
+                            RESPONSE_CACHE_TTL_SECONDS)
+
+logger = logging.getLogger("notes_api")
+
+cache_redis = redis.from_url(REDIS_URL) if RESPONSE_CACHE_ENABLED else None
+
+
+def build_etag(
+        user_id: int,
+        version: int,
+        resource: str,
+        ) -> str:
+    digest = hashlib.sha1(f"{user_id}:{version}:{resource}".encode()).hexdigest()
+    return f'"{digest}"'
+
+def etag_matches(
+        if_none_match: Optional[str],
+        etag: str,
+        ) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {value.strip().removeprefix("W/") for value in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+# В ключ входит ETag, а значит и версия: после записи старые ответы просто истекают по TTL
+def _cache_key(
+        user_id: int,
+        etag: str,
+        ) -> str:
+    digest = etag.strip('"')
+    return f"notes_cache:{user_id}:{digest}"
+
+async def get_cached_response(
+        user_id: int,
+        etag: str,
+        ) -> Optional[Tuple[bytes, Optional[str]]]:
+    if cache_redis is None:
+        return None
+    try:
+        cached = await cache_redis.hgetall(_cache_key(user_id, etag))
+    except redis.RedisError:
+        logger.warning("Response cache is unavailable")
+        return None
+    if not cached:
+        return None
+    next_cursor = cached.get(b"next_cursor", b"").decode() or None
+    return cached[b"body"], next_cursor
+
+async def set_cached_response(
+        user_id: int,
+        etag: str,
+        body: bytes,
+        next_cursor: Optional[str] = None,
+        ):
+    if cache_redis is None:
+        return
+    key = _cache_key(user_id, etag)
+    try:
+        async with cache_redis.pipeline(transaction=False) as pipe:
+            pipe.hset(key, mapping={"body": body, "next_cursor": next_cursor or ""})
+            pipe.expire(key, int(RESPONSE_CACHE_TTL_SECONDS))
+            await pipe.execute()
+    except redis.RedisError:
+        logger.warning("Response cache is unavailable")
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, TypeAdapter
 from typing import List, Optional
 from datetime import datetime
 
@@ -11,8 +11,13 @@ class TagCreate(TagBase):
 class Tag(TagBase):
     id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class TagCount(BaseModel):
+    name: str
+    note_count: int
+
+    model_config = ConfigDict(from_attributes=True)
 
 class NoteBase(BaseModel):
     title: str
@@ -24,14 +29,43 @@ class NoteCreate(NoteBase):
 class NoteUpdate(NoteBase):
     tags: Optional[List[str]] = []
 
+class NoteBulkUpdate(NoteUpdate):
+    id: int
+
+class NoteIds(BaseModel):
+    ids: List[int]
+
+class BulkItemResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    status: str
+    error: Optional[str] = None
+
+class BulkResult(BaseModel):
+    results: List[BulkItemResult]
+
 class NoteInDB(NoteBase):
     id: int
     created_at: datetime
     updated_at: datetime
     tags: List[Tag] = []
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class NoteSummary(BaseModel):
+    id: int
+    title: str
+    created_at: datetime
+    updated_at: datetime
+    tags: List[Tag] = []
+
+    model_config = ConfigDict(from_attributes=True)
+
+class NoteChanges(BaseModel):
+    notes: List[NoteInDB]
+    deleted: List[int]
+    cursor: int
+    has_more: bool
 
 class UserBase(BaseModel):
     username: str
@@ -42,12 +76,22 @@ class UserCreate(UserBase):
 class User(UserBase):
     id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class Token(BaseModel):
     access_token: str
     token_type: str
+    expires_in: Optional[int] = None
+    refresh_token: Optional[str] = None
+    refresh_expires_in: Optional[int] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
     username: str
+
+# Собранные заранее адаптеры для сериализации списков без FastAPI jsonable_encoder
+note_adapter = TypeAdapter(NoteInDB)
+note_list_adapter = TypeAdapter(List[NoteInDB])
+note_summary_list_adapter = TypeAdapter(List[NoteSummary])
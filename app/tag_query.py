@@ -0,0 +1,119 @@
+import re
+from typing import List, Tuple
+from sqlalchemy import and_, exists, not_, or_, select
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.models import Note, Tag, note_tags
+
+# Выражения вида: work AND (urgent OR today) NOT archived
+# Соседние теги без оператора объединяются через AND, имена с пробелами берутся в кавычки
+MAX_TERMS = 32
+_TOKEN_RE = re.compile(r'\s*(?:(\()|(\))|"([^"]*)"|([^\s()"]+))')
+_OPERATORS = {"AND", "OR", "NOT"}
+
+
+class TagQueryError(ValueError):
+    pass
+
+
+def tokenize(expression: str) -> List[Tuple[str, str]]:
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _TOKEN_RE.match(expression, position)
+        if not match:
+            raise TagQueryError(f"Unexpected character at position {position}")
+        position = match.end()
+        opening, closing, quoted, word = match.groups()
+        if opening:
+            tokens.append(("(", opening))
+        elif closing:
+            tokens.append((")", closing))
+        elif quoted is not None:
+            tokens.append(("TAG", quoted))
+        elif word.upper() in _OPERATORS:
+            tokens.append((word.upper(), word))
+        else:
+            tokens.append(("TAG", word))
+    return tokens
+
+
+def tag_condition(name: str) -> ColumnElement:
+    return exists(
+        select(note_tags.c.note_id)
+        .join(Tag, Tag.id == note_tags.c.tag_id)
+        .where(
+            note_tags.c.note_id == Note.id,
+            Tag.name == name,
+            )
+        )
+
+
+class _Parser:
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.position = 0
+        self.terms = 0
+
+    def peek(self) -> str:
+        if self.position < len(self.tokens):
+            return self.tokens[self.position][0]
+        return ""
+
+    def take(self) -> Tuple[str, str]:
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def parse(self) -> ColumnElement:
+        condition = self.parse_or()
+        if self.position != len(self.tokens):
+            raise TagQueryError(f"Unexpected token: {self.tokens[self.position][1]}")
+        return condition
+
+    def parse_or(self) -> ColumnElement:
+        conditions = [self.parse_and()]
+        while self.peek() == "OR":
+            self.take()
+            conditions.append(self.parse_and())
+        return conditions[0] if len(conditions) == 1 else or_(*conditions)
+
+    def parse_and(self) -> ColumnElement:
+        conditions = [self.parse_not()]
+        while self.peek() in ("AND", "NOT", "TAG", "("):
+            if self.peek() == "AND":
+                self.take()
+            conditions.append(self.parse_not())
+        return conditions[0] if len(conditions) == 1 else and_(*conditions)
+
+    def parse_not(self) -> ColumnElement:
+        if self.peek() == "NOT":
+            self.take()
+            return not_(self.parse_not())
+        return self.parse_atom()
+
+    def parse_atom(self) -> ColumnElement:
+        kind = self.peek()
+        if kind == "(":
+            self.take()
+            condition = self.parse_or()
+            if self.peek() != ")":
+                raise TagQueryError("Missing closing parenthesis")
+            self.take()
+            return condition
+        if kind == "TAG":
+            self.terms += 1
+            if self.terms > MAX_TERMS:
+                raise TagQueryError(f"Too many tags in expression, at most {MAX_TERMS}")
+            return tag_condition(self.take()[1])
+        if not kind:
+            raise TagQueryError("Unexpected end of expression")
+        raise TagQueryError(f"Unexpected token: {self.take()[1]}")
+
+
+def compile_tag_query(expression: str) -> ColumnElement:
+    tokens = tokenize(expression)
+    if not tokens:
+        raise TagQueryError("Empty expression")
+    return _Parser(tokens).parse()
@@ -0,0 +1,105 @@
+"""Нагрузочный замер GET /notes/: p50/p99 и пропускная способность.
+
+Запускается против поднятого docker-compose API (с RATE_LIMIT_ENABLED=false,
+иначе упрётся в лимит на пользователя):
+
+    python benchmarks/bench_notes_load.py --url http://localhost:8000/ --notes 200 --requests 5000 --concurrency 50
+
+Для сравнения со старым синхронным слоем БД тот же скрипт запускается против
+API, собранного из базового коммита (git checkout <baseline> -- app && docker-compose up --build).
+Заметки создаются по одной через POST /notes/, который есть в обеих версиях.
+
+Базовая версия отдаёт все заметки сразу, новая - страницу в NOTES_PAGE_DEFAULT_LIMIT (50).
+Чтобы обе версии отдавали одинаковый объём, запрос идёт с limit=--notes (базовая версия
+параметр игнорирует), поэтому --notes не больше NOTES_PAGE_MAX_LIMIT (500). Перед замером
+скрипт проверяет, что ответ содержит ровно --notes заметок.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+import httpx
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def seed(client, token, count, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def create(index):
+        async with semaphore:
+            response = await client.post(
+                "notes/",
+                json={
+                    "title": f"bench note {index}",
+                    "content": "benchmark content " * 20,
+                    "tags": ["bench", f"tag{index % 10}"],
+                    },
+                headers={"Authorization": f"Bearer {token}"},
+                )
+            response.raise_for_status()
+
+    await asyncio.gather(*(create(index) for index in range(count)))
+
+async def run(args):
+    async with httpx.AsyncClient(
+            base_url=args.url,
+            timeout=60,
+            limits=httpx.Limits(max_connections=args.concurrency),
+            ) as client:
+        username = f"bench_{uuid.uuid4().hex[:8]}"
+        password = uuid.uuid4().hex
+        response = await client.post("users/", json={"username": username, "password": password})
+        response.raise_for_status()
+        response = await client.post("token", data={"username": username, "password": password})
+        response.raise_for_status()
+        token = response.json()["access_token"]
+        await seed(client, token, args.notes, args.concurrency)
+
+        headers = {"Authorization": f"Bearer {token}"}
+        params = {"limit": args.notes}
+        response = await client.get("notes/", params=params, headers=headers)
+        response.raise_for_status()
+        if len(response.json()) != args.notes:
+            raise SystemExit(f"GET notes/ returned {len(response.json())} notes, expected {args.notes}")
+
+        latencies = []
+        errors = 0
+        remaining = iter(range(args.requests))
+
+        async def worker():
+            nonlocal errors
+            for _ in remaining:
+                start = time.perf_counter()
+                response = await client.get(
+                    "notes/",
+                    params=params,
+                    headers=headers,
+                    )
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    print(f"notes={args.notes} requests={args.requests} concurrency={args.concurrency}")
+    print(f"throughput: {args.requests / elapsed:.1f} req/s, errors: {errors}")
+    print(
+        f"latency ms: p50={percentile(latencies, 0.5) * 1000:.1f} "
+        f"p90={percentile(latencies, 0.9) * 1000:.1f} "
+        f"p99={percentile(latencies, 0.99) * 1000:.1f} "
+        f"mean={statistics.mean(latencies) * 1000:.1f}"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000/")
+    parser.add_argument("--notes", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    asyncio.run(run(parser.parse_args()))
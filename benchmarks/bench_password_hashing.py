@@ -0,0 +1,54 @@
+"""Пропускная способность проверки паролей при конкурентных логинах.
+
+Сравнивает вызов bcrypt прямо в event loop (как было раньше в /token)
+с verify_password, который уходит в пул потоков. Кроме времени пачки
+печатает максимальную задержку event loop: её видят все остальные запросы.
+
+    python -m benchmarks.bench_password_hashing --logins 64
+
+Нужны только переменные из .env (Postgres не используется).
+"""
+import argparse
+import asyncio
+import time
+from app.auth import pwd_context, verify_password
+from app.app_config import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS
+
+
+async def inline_verify(password, hashed_password):
+    return pwd_context.verify_and_update(password, hashed_password)
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.01):
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+async def run_batch(verify, logins, hashed_password):
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop))
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(verify("password", hashed_password) for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    lag = await lag_task
+    assert all(result[0] for result in results)
+    return elapsed, lag
+
+async def run(args):
+    hashed_password = pwd_context.hash("password")
+    print(f"bcrypt rounds={BCRYPT_ROUNDS} workers={PASSWORD_HASH_WORKERS} logins={args.logins}")
+    for name, verify in (("inline", inline_verify), ("thread pool", verify_password)):
+        elapsed, lag = await run_batch(verify, args.logins, hashed_password)
+        print(
+            f"{name:<12} {args.logins / elapsed:8.1f} logins/s  "
+            f"total {elapsed * 1000:8.1f} ms  max loop lag {lag * 1000:8.1f} ms"
+            )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=32)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,63 @@
+"""Стоимость сериализации списка заметок на 1000 штук.
+
+Сравнивает путь через response_model (валидация, затем jsonable_encoder и
+JSONResponse) с собранным заранее TypeAdapter, который валидирует ORM-объекты
+и пишет JSON-байты за один проход (как render_json в fastapi_routes).
+
+    python -m benchmarks.bench_serialization --notes 1000 --repeat 20
+
+БД не нужна: заметки - простые объекты с теми же атрибутами, что у ORM-модели.
+"""
+import argparse
+import timeit
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import List
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+from app.schemas import NoteInDB, note_list_adapter
+
+
+def build_notes(count: int) -> list:
+    now = datetime(2024, 1, 1)
+    return [
+        SimpleNamespace(
+            id=index,
+            title=f"Заметка {index}",
+            content="Текст заметки " * 20,
+            created_at=now + timedelta(seconds=index),
+            updated_at=now + timedelta(seconds=index),
+            tags=[SimpleNamespace(id=tag, name=f"tag{tag}") for tag in range(index % 4)],
+            )
+        for index in range(count)
+        ]
+
+response_model_adapter = TypeAdapter(List[NoteInDB])
+
+def old_path(notes) -> bytes:
+    models = response_model_adapter.validate_python(notes, from_attributes=True)
+    return JSONResponse(jsonable_encoder(models)).body
+
+def orjson_response_path(notes) -> bytes:
+    models = response_model_adapter.validate_python(notes, from_attributes=True)
+    return ORJSONResponse(jsonable_encoder(models)).body
+
+def adapter_path(notes) -> bytes:
+    return note_list_adapter.dump_json(note_list_adapter.validate_python(notes, from_attributes=True))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    notes = build_notes(args.notes)
+    scale = 1000 / args.notes
+    for name, render in (
+            ("jsonable_encoder + JSONResponse", old_path),
+            ("jsonable_encoder + ORJSONResponse", orjson_response_path),
+            ("TypeAdapter.dump_json", adapter_path),
+            ):
+        best = min(timeit.repeat(lambda: render(notes), number=1, repeat=args.repeat))
+        print(f"{name:<36} {best * scale * 1000:8.2f} ms per 1000 notes ({len(render(notes))} bytes)")
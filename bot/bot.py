@@ -1,28 +1,146 @@
+import asyncio
 import logging
-from logging.handlers import TimedRotatingFileHandler
+import multiprocessing
+import sys
+from typing import Optional
+import orjson
+from aiohttp import web
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.redis import RedisStorage
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from bot_auth_router import auth_router
 from bot_notes_router import notes_router
-from bot_config import REDIS_URL, API_TOKEN
+from bot_http import close_api_client
+from bot_sender import sender
+from bot_middlewares import chat_lock_middleware, throttling_middleware
+from bot_redis import bot_redis, redis_report
+from bot_config import (API_TOKEN,
+                        BOT_MODE,
+                        WEBHOOK_URL,
+                        WEBHOOK_PATH,
+                        WEBHOOK_SECRET,
+                        WEBHOOK_HOST,
+                        WEBHOOK_PORT,
+                        WEBHOOK_WORKERS,
+                        WEBHOOK_MAX_CONNECTIONS,
+                        FSM_STATE_TTL,
+                        FSM_DATA_TTL,
+                        LOG_LEVEL,
+                        LOG_INFO_SAMPLE_RATE,
+                        LOG_JSON)
+from common.log_config import request_id_var, setup_logging
 
 logger = logging.getLogger("aiogram_bot")
-logger.setLevel(logging.INFO)
-handler = TimedRotatingFileHandler("logs/bot.log", when="midnight", interval=1, backupCount=7)
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
+
+def configure_logging(filename: str = "logs/bot.log"):
+    # Каждый процесс пишет в свой файл: ротация одного файла из нескольких процессов
+    # теряет и перезаписывает строки
+    setup_logging(
+        name="aiogram_bot",
+        filename=filename,
+        level=LOG_LEVEL,
+        sample_rate=float(LOG_INFO_SAMPLE_RATE),
+        json_format=LOG_JSON,
+        )
 
 bot = Bot(token=API_TOKEN)
-storage = RedisStorage.from_url(REDIS_URL)
+# Черновики брошенных диалогов удаляются по TTL, данные хранятся в компактном JSON
+storage = RedisStorage(
+    redis=bot_redis,
+    state_ttl=int(FSM_STATE_TTL),
+    data_ttl=int(FSM_DATA_TTL),
+    json_dumps=orjson.dumps,
+    json_loads=orjson.loads,
+    )
 dp = Dispatcher(storage=storage)
+dp.include_router(auth_router)
+dp.include_router(notes_router)
+dp.startup.register(sender.start)
+dp.shutdown.register(sender.stop)
+dp.shutdown.register(close_api_client)
+dp.message.outer_middleware(throttling_middleware)
 
-async def main():
-    dp.include_router(auth_router)
-    dp.include_router(notes_router)
 
+# Каждый апдейт получает свой идентификатор для корреляции строк лога
+@dp.update.outer_middleware()
+async def request_id_middleware(handler, event, data):
+    token = request_id_var.set(f"upd-{event.update_id}")
+    try:
+        return await handler(event, data)
+    finally:
+        request_id_var.reset(token)
+
+async def main():
+    await bot.delete_webhook()
     await dp.start_polling(bot)
 
+async def set_webhook():
+    await bot.set_webhook(
+        url=WEBHOOK_URL,
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types(),
+        max_connections=int(WEBHOOK_MAX_CONNECTIONS),
+        )
+    await bot.session.close()
+    logger.info("Webhook set: %s", WEBHOOK_URL)
+
+def run_webhook_worker(worker_index: Optional[int] = None):
+    if worker_index is not None:
+        configure_logging(f"logs/bot.worker{worker_index}.log")
+    # В режиме вебхука апдейты одного чата могут прийти в разные процессы и реплики
+    dp.update.outer_middleware(chat_lock_middleware)
+
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=WEBHOOK_SECRET,
+        handle_in_background=False,
+        ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    # reuse_port позволяет нескольким процессам слушать один порт
+    web.run_app(
+        app,
+        host=WEBHOOK_HOST,
+        port=int(WEBHOOK_PORT),
+        reuse_port=True,
+        print=None,
+        )
+
+def run_webhook():
+    asyncio.run(set_webhook())
+    workers = int(WEBHOOK_WORKERS)
+    if workers == 1:
+        run_webhook_worker()
+        return
+
+    # spawn, а не fork: каждому процессу нужен свой поток логирования и свои соединения
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_webhook_worker, args=(index,))
+        for index in range(workers)
+        ]
+    for process in processes:
+        process.start()
+    logger.info("Webhook workers started: %s", workers)
+    for process in processes:
+        process.join()
+
+async def print_redis_report():
+    report = await redis_report()
+    print(f"{'pattern':<40} {'keys':>10} {'bytes':>14} {'no ttl':>10}")
+    for pattern, entry in sorted(report.items(), key=lambda item: item[1]["bytes"], reverse=True):
+        print(f"{pattern:<40} {entry['keys']:>10} {entry['bytes']:>14} {entry['no_ttl']:>10}")
+    await bot_redis.aclose()
+
 if __name__ == '__main__':
-    import asyncio
-    asyncio.run(main())
+    configure_logging()
+    command = sys.argv[1] if len(sys.argv) > 1 else "run"
+    if command == "redis-report":
+        asyncio.run(print_redis_report())
+    elif command != "run":
+        sys.exit(f"Unknown command: {command}")
+    elif BOT_MODE == "webhook":
+        run_webhook()
+    else:
+        asyncio.run(main())
@@ -1,10 +1,10 @@
-import httpx
 from aiogram import types
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.dispatcher.router import Router
 from aiogram.filters import CommandStart
-from bot_config import API_URL
+from bot_http import notes_api
+from common.notes_client import NotesAPIError
 from bot_redis import save_token_to_redis
 auth_router = Router()
 
@@ -44,21 +44,18 @@ async def process_password(
         await message.answer("Сначала введите username.")
         return
     
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{API_URL}token", 
-            data={
-                "username": username, 
-                "password": password
-                },
-                )
+    try:
+        token = await notes_api.login(
+            username=username, 
+            password=password,
+            )
+    except NotesAPIError:
+        token = None
     
-    if response.status_code == 200:
-        token_data = response.json()
-        access_token = token_data.get("access_token")
+    if token:
         await save_token_to_redis(
             user_id=message.from_user.id, 
-            token=access_token,
+            token=token,
             )
         await message.answer("Вы успешно авторизованы!")
         await message.answer("Список доступных команд: /create_note - создать заметку,\n /search_notes - поиск заметок по тэгу,\n /get_notes - cписок заметок\n")
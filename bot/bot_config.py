@@ -5,8 +5,55 @@ load_dotenv()
 
 API_URL = os.environ.get("API_URL")
 API_TOKEN = os.environ.get("API_TOKEN")
+# Тот же ключ, что у API: запросы бота не ограничиваются по IP
+RATE_LIMIT_CLIENT_KEY = os.environ.get("RATE_LIMIT_CLIENT_KEY")
+TOKEN_REFRESH_MARGIN_SECONDS = os.environ.get("TOKEN_REFRESH_MARGIN_SECONDS", "60")
+
+# WEBHOOK
+BOT_MODE = os.environ.get("BOT_MODE", "polling")
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL")
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET")
+WEBHOOK_HOST = os.environ.get("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = os.environ.get("WEBHOOK_PORT", "8080")
+WEBHOOK_WORKERS = os.environ.get("WEBHOOK_WORKERS", "1")
+WEBHOOK_MAX_CONNECTIONS = os.environ.get("WEBHOOK_MAX_CONNECTIONS", "40")
+# Апдейты чата упорядочиваются по update_id; после CHAT_LOCK_WAIT секунд ожидания порядок не гарантируется
+CHAT_LOCK_TIMEOUT = os.environ.get("CHAT_LOCK_TIMEOUT", "60")
+CHAT_LOCK_WAIT = os.environ.get("CHAT_LOCK_WAIT", "30")
 # REDIS
 REDIS_HOST = os.environ.get("REDIS_HOST")
 REDIS_NUM_DB = os.environ.get("REDIS_NUM_DB")
 REDIS_PORT = os.environ.get("REDIS_PORT")
-REDIS_URL = f'redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_NUM_DB}'
\ No newline at end of file
+REDIS_URL = f'redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_NUM_DB}'
+REDIS_MAX_CONNECTIONS = os.environ.get("REDIS_MAX_CONNECTIONS", "50")
+FSM_STATE_TTL = os.environ.get("FSM_STATE_TTL", "86400")
+FSM_DATA_TTL = os.environ.get("FSM_DATA_TTL", "86400")
+BOT_RATE_LIMIT_RPS = os.environ.get("BOT_RATE_LIMIT_RPS", "1")
+BOT_RATE_LIMIT_BURST = os.environ.get("BOT_RATE_LIMIT_BURST", "5")
+
+# NOTE LISTS
+BOT_NOTES_MAX = os.environ.get("BOT_NOTES_MAX", "500")
+BOT_NOTES_PAGE_SIZE = os.environ.get("BOT_NOTES_PAGE_SIZE", "100")
+
+# SEND QUEUE
+SEND_GLOBAL_RATE = os.environ.get("SEND_GLOBAL_RATE", "25")
+SEND_CHAT_INTERVAL = os.environ.get("SEND_CHAT_INTERVAL", "1")
+SEND_MAX_RETRIES = os.environ.get("SEND_MAX_RETRIES", "5")
+SEND_MAX_PENDING_PER_CHAT = os.environ.get("SEND_MAX_PENDING_PER_CHAT", "50")
+SEND_SHUTDOWN_TIMEOUT = os.environ.get("SEND_SHUTDOWN_TIMEOUT", "10")
+
+# HTTP CLIENT
+HTTP_TIMEOUT = os.environ.get("HTTP_TIMEOUT", "30")
+HTTP_CONNECT_TIMEOUT = os.environ.get("HTTP_CONNECT_TIMEOUT", "5")
+HTTP_MAX_CONNECTIONS = os.environ.get("HTTP_MAX_CONNECTIONS", "100")
+HTTP_MAX_KEEPALIVE = os.environ.get("HTTP_MAX_KEEPALIVE", "20")
+HTTP_KEEPALIVE_EXPIRY = os.environ.get("HTTP_KEEPALIVE_EXPIRY", "30")
+HTTP_RETRIES = os.environ.get("HTTP_RETRIES", "2")
+HTTP_RETRY_BACKOFF = os.environ.get("HTTP_RETRY_BACKOFF", "0.3")
+HTTP_CACHE_SIZE = os.environ.get("HTTP_CACHE_SIZE", "1024")
+
+# LOGGING
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_INFO_SAMPLE_RATE = os.environ.get("LOG_INFO_SAMPLE_RATE", "1.0")
+LOG_JSON = os.environ.get("LOG_JSON", "true").lower() == "true"
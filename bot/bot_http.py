@@ -0,0 +1,41 @@
+import importlib.util
+import httpx
+from bot_config import (API_URL,
+                        HTTP_TIMEOUT,
+                        HTTP_CONNECT_TIMEOUT,
+                        HTTP_MAX_CONNECTIONS,
+                        HTTP_MAX_KEEPALIVE,
+                        HTTP_KEEPALIVE_EXPIRY,
+                        HTTP_RETRIES,
+                        HTTP_RETRY_BACKOFF,
+                        HTTP_CACHE_SIZE,
+                        RATE_LIMIT_CLIENT_KEY)
+from common.notes_client import NotesClient
+
+# HTTP/2 включается, только если установлен пакет h2
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Один клиент на процесс бота: соединения к API переиспользуются между апдейтами
+notes_api = NotesClient(
+    http_client=httpx.AsyncClient(
+        base_url=API_URL,
+        headers={"X-Client-Key": RATE_LIMIT_CLIENT_KEY} if RATE_LIMIT_CLIENT_KEY else None,
+        timeout=httpx.Timeout(float(HTTP_TIMEOUT), connect=float(HTTP_CONNECT_TIMEOUT)),
+        # Ошибки установки соединения безопасно повторять для любого метода
+        transport=httpx.AsyncHTTPTransport(
+            http2=HTTP2_AVAILABLE,
+            retries=int(HTTP_RETRIES),
+            limits=httpx.Limits(
+                max_connections=int(HTTP_MAX_CONNECTIONS),
+                max_keepalive_connections=int(HTTP_MAX_KEEPALIVE),
+                keepalive_expiry=float(HTTP_KEEPALIVE_EXPIRY),
+                ),
+            ),
+        ),
+    retries=int(HTTP_RETRIES),
+    retry_backoff=float(HTTP_RETRY_BACKOFF),
+    cache_size=int(HTTP_CACHE_SIZE),
+    )
+
+async def close_api_client():
+    await notes_api.close()
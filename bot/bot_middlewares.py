@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import math
+import time
+from redis.exceptions import LockError, RedisError
+from bot_config import (CHAT_LOCK_TIMEOUT,
+                        CHAT_LOCK_WAIT,
+                        BOT_RATE_LIMIT_RPS,
+                        BOT_RATE_LIMIT_BURST)
+from bot_redis import bot_redis
+from common.token_bucket import TokenBucketLimiter
+
+logger = logging.getLogger("aiogram_bot")
+
+limiter = TokenBucketLimiter(
+    bot_redis,
+    prefix="ratelimit:bot",
+    logger=logger,
+    )
+
+
+# Как часто ожидающий апдейт проверяет, не подошла ли его очередь
+CHAT_QUEUE_POLL_SECONDS = 0.05
+
+# KEYS[1] - ожидающие апдейты по update_id, KEYS[2] - время постановки каждого из них.
+# Записи старше ARGV[2] секунд (обработчик упал, не успев себя удалить) вычищаются поштучно;
+# TTL ключей только убирает очередь чата, в котором давно ничего не происходит.
+# Ставит апдейт ARGV[1] в очередь, если его там нет, и возвращает голову очереди
+CHAT_QUEUE_SCRIPT = """
+local now = tonumber(redis.call('TIME')[1])
+local timeout = tonumber(ARGV[2])
+local stale = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now - timeout)
+for _, member in ipairs(stale) do
+    redis.call('ZREM', KEYS[1], member)
+    redis.call('ZREM', KEYS[2], member)
+end
+if redis.call('ZADD', KEYS[2], 'NX', now, ARGV[1]) == 1 then
+    redis.call('ZADD', KEYS[1], ARGV[1], ARGV[1])
+    redis.call('EXPIRE', KEYS[1], timeout)
+    redis.call('EXPIRE', KEYS[2], timeout)
+end
+return redis.call('ZRANGE', KEYS[1], 0, 0)[1]
+"""
+chat_queue_script = bot_redis.register_script(CHAT_QUEUE_SCRIPT)
+
+
+def chat_queue_keys(chat_id: int) -> list:
+    return [f"chat:{chat_id}:queue", f"chat:{chat_id}:queue:since"]
+
+async def wait_for_turn(chat_id: int, update_id: int, deadline: float):
+    # Первым идёт апдейт с наименьшим update_id из ожидающих в этом чате
+    while True:
+        head = await chat_queue_script(
+            keys=chat_queue_keys(chat_id),
+            args=[update_id, int(CHAT_LOCK_TIMEOUT)],
+            )
+        if head is None or int(head) == update_id or time.monotonic() >= deadline:
+            return
+        await asyncio.sleep(CHAT_QUEUE_POLL_SECONDS)
+
+async def leave_queue(chat_id: int, update_id: int):
+    async with bot_redis.pipeline(transaction=False) as pipe:
+        for key in chat_queue_keys(chat_id):
+            pipe.zrem(key, update_id)
+        await pipe.execute()
+
+
+# Апдейты одного чата обрабатываются по очереди в порядке update_id, даже если пришли
+# на разные реплики. Порядок соблюдается среди одновременно ожидающих апдейтов; если Redis
+# недоступен или ожидание превысило CHAT_LOCK_WAIT, апдейт обрабатывается без очереди
+async def chat_lock_middleware(handler, event, data):
+    chat = data.get("event_chat")
+    if chat is None:
+        return await handler(event, data)
+
+    deadline = time.monotonic() + float(CHAT_LOCK_WAIT)
+    lock = bot_redis.lock(
+        f"chat:{chat.id}:lock",
+        timeout=float(CHAT_LOCK_TIMEOUT),
+        )
+    try:
+        await wait_for_turn(chat.id, event.update_id, deadline)
+        acquired = await lock.acquire(blocking_timeout=max(deadline - time.monotonic(), 0.1))
+    except RedisError:
+        logger.warning("Chat lock unavailable for chat %s", chat.id)
+        acquired = False
+    if not acquired:
+        logger.warning("Update %s for chat %s processed out of order", event.update_id, chat.id)
+    try:
+        return await handler(event, data)
+    finally:
+        try:
+            await leave_queue(chat.id, event.update_id)
+        except RedisError:
+            logger.warning("Chat queue unavailable for chat %s", chat.id)
+        if acquired:
+            try:
+                await lock.release()
+            except (LockError, RedisError):
+                # Блокировка истекла по таймауту и уже могла достаться другому обработчику
+                logger.warning("Chat lock for chat %s expired before release", chat.id)
+
+
+# Флуд от одного пользователя не доходит до API; предупреждение отправляется один раз за окно
+async def throttling_middleware(handler, event, data):
+    user = data.get("event_from_user")
+    if user is None:
+        return await handler(event, data)
+
+    allowed, retry_after = await limiter.consume(
+        f"user:{user.id}",
+        rate=float(BOT_RATE_LIMIT_RPS),
+        capacity=float(BOT_RATE_LIMIT_BURST),
+        )
+    if allowed:
+        return await handler(event, data)
+
+    retry_after = max(1, math.ceil(retry_after))
+    try:
+        notify = await bot_redis.set(
+            f"ratelimit:bot:notified:{user.id}",
+            1,
+            ex=retry_after,
+            nx=True,
+            )
+    except RedisError:
+        notify = False
+    if notify:
+        await event.answer(f"Слишком много сообщений, попробуйте через {retry_after} с.")
+    return None
@@ -1,11 +1,14 @@
-import httpx
+from typing import AsyncIterator, List, Tuple
 from aiogram import types
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.dispatcher.router import Router
 from aiogram.filters import Command
-from bot_config import API_URL
-from bot_redis import get_token_from_redis
+from bot_config import BOT_NOTES_MAX, BOT_NOTES_PAGE_SIZE
+from bot_http import notes_api
+from bot_sender import sender
+from common.notes_client import NotesAPIError, Note
+from bot_redis import get_token_from_redis, get_token_and_data
 
 
 notes_router = Router()
@@ -15,6 +18,32 @@ class NoteStates(StatesGroup):
     waiting_for_note_tags = State()
     waiting_for_search_tag = State()
 
+async def get_tag_suggestions(token: str) -> str:
+    try:
+        tags = await notes_api.get_tags(token, limit=10)
+    except NotesAPIError:
+        return ""
+    if not tags:
+        return ""
+    return "\nВаши теги: " + ", ".join(tag.name for tag in tags)
+
+def format_notes(notes: List[Note]) -> List[str]:
+    return [f"Заметка {note.id}:\n{note.title}\n{note.content}" for note in notes]
+
+# API отдаёт заметки страницами, бот проходит по курсору до BOT_NOTES_MAX заметок
+async def collect_notes(pages: AsyncIterator[Note]) -> Tuple[List[Note], bool]:
+    notes = []
+    async for note in pages:
+        if len(notes) >= int(BOT_NOTES_MAX):
+            return notes, True
+        notes.append(note)
+    return notes, False
+
+def truncation_notice(truncated: bool) -> List[str]:
+    if not truncated:
+        return []
+    return [f"Показаны первые {BOT_NOTES_MAX} заметок."]
+
 @notes_router.message(Command(commands=['create_note']))
 async def create_note_start(
     message: types.Message, 
@@ -45,7 +74,11 @@ async def process_note_content(
     state: FSMContext,
     ):
     await state.update_data(content=message.text)
-    await message.answer("Введите теги заметки (через запятую):")
+    token = await get_token_from_redis(
+        user_id=message.from_user.id,
+        )
+    suggestions = await get_tag_suggestions(token) if token else ""
+    await message.answer("Введите теги заметки (через запятую):" + suggestions)
     await state.set_state(NoteStates.waiting_for_note_tags)
 
 @notes_router.message(NoteStates.waiting_for_note_tags)
@@ -54,34 +87,30 @@ async def process_note_tags(
     state: FSMContext,
     ):
     tags = message.text.split(',')
-    data = await state.get_data()
-    note_data = {
-        "title": data["title"],
-        "content": data["content"],
-        "tags": [tag.strip() for tag in tags]
-    }
-    
-    token = await get_token_from_redis(
+    token, data = await get_token_and_data(
         user_id=message.from_user.id,
+        state=state,
         )
     if token is None:
         await message.answer("Сначала авторизуйтесь.")
         return
+    if "title" not in data or "content" not in data:
+        # Черновик удалён по TTL хранилища FSM
+        await message.answer("Черновик заметки устарел, начните заново: /create_note")
+        await state.clear()
+        return
     
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{API_URL}notes/", 
-            json=note_data, 
-            headers={
-                "Authorization": f"Bearer {token}",
-                }, 
-                timeout=30,
-                )
-
-    if response.status_code == 200:
-        await message.answer("Заметка успешно создана!")
-    else:
+    try:
+        await notes_api.create_note(
+            token,
+            title=data["title"],
+            content=data["content"],
+            tags=[tag.strip() for tag in tags],
+            )
+    except NotesAPIError:
         await message.answer("Ошибка создания заметки.")
+    else:
+        await message.answer("Заметка успешно создана!")
     
     await state.clear()
 
@@ -97,7 +126,8 @@ async def search_notes_start(
         await message.answer("Сначала авторизуйтесь.")
         return
     
-    await message.answer("Введите тег для поиска заметок:")
+    suggestions = await get_tag_suggestions(token)
+    await message.answer("Введите тег для поиска заметок:" + suggestions)
     await state.set_state(NoteStates.waiting_for_search_tag)
 
 @notes_router.message(NoteStates.waiting_for_search_tag)
@@ -114,26 +144,19 @@ async def process_search_tag(
         await message.answer("Сначала авторизуйтесь.")
         return
     
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{API_URL}search", 
-            params={
-                "tag": tag,
-                }, 
-            headers={
-                "Authorization": f"Bearer {token}",
-                },
-                )
-    
-    if response.status_code == 200:
-        notes = response.json()
-        if notes:
-            notes_message = "\n\n".join([f"Заметка {note['id']}:\n{note['title']}\n{note['content']}" for note in notes])
-        else:
-            notes_message = "Нет заметок с таким тегом."
-        await message.answer(notes_message)
-    else:
+    try:
+        notes, truncated = await collect_notes(notes_api.iter_search(
+            token,
+            tag=tag,
+            page_size=int(BOT_NOTES_PAGE_SIZE),
+            ))
+    except NotesAPIError:
         await message.answer("Ошибка поиска заметок.")
+    else:
+        sender.send_parts(
+            message.chat.id,
+            (format_notes(notes) or ["Нет заметок с таким тегом."]) + truncation_notice(truncated),
+            )
     
     await state.clear()
 
@@ -147,22 +170,16 @@ async def get_notes(message: types.Message,):
         await message.answer("Сначала авторизуйтесь.")
         return
     
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{API_URL}notes/", 
-            headers={
-                "Authorization": f"Bearer {token}"
-                },
-                )
-
-    if response.status_code == 200:
-        notes = response.json()
-        if notes:
-            notes_message = "\n\n".join([f"Заметка {note['id']}:\n{note['title']}\n{note['content']}" for note in notes])
-        else:
-            notes_message = "У вас пока нет заметок."
-        
-        await message.answer(notes_message)
-    else:
+    try:
+        notes, truncated = await collect_notes(notes_api.iter_notes(
+            token,
+            page_size=int(BOT_NOTES_PAGE_SIZE),
+            ))
+    except NotesAPIError:
         await message.answer("Ошибка получения заметок.")
+    else:
+        sender.send_parts(
+            message.chat.id,
+            (format_notes(notes) or ["У вас пока нет заметок."]) + truncation_notice(truncated),
+            )
     
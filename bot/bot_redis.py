@@ -1,21 +1,138 @@
+import re
+import time
+from collections import defaultdict
+from typing import Optional, Tuple
+import httpx
 import redis.asyncio as redis
-from bot_config import REDIS_URL
+from aiogram.fsm.context import FSMContext
+from redis.exceptions import LockError
+from bot_config import REDIS_URL, REDIS_MAX_CONNECTIONS, TOKEN_REFRESH_MARGIN_SECONDS
+from bot_http import notes_api
+from common.notes_client import NotesAPIError, Token, UnauthorizedError
 
-bot_redis = redis.from_url(REDIS_URL)
+# Один пул соединений на процесс: его же использует хранилище FSM
+bot_redis = redis.Redis(
+    connection_pool=redis.ConnectionPool.from_url(
+        REDIS_URL,
+        max_connections=int(REDIS_MAX_CONNECTIONS),
+        ),
+    )
+
+# Раньше токен лежал строкой в user:{id}:token; новое имя ключа не даёт WRONGTYPE
+# на старых записях, а те сами истекут по своему TTL
+def token_key(user_id: int) -> str:
+    return f"user:{user_id}:session"
 
 async def save_token_to_redis(
         user_id: int, 
-        token: str,
+        token: Token,
         ):
-    await bot_redis.set(
-        f"user:{user_id}:token", 
-        token, 
-        ex=3600,
-        )
-
-async def get_token_from_redis(user_id: int):
-    token = await bot_redis.get(f"user:{user_id}:token")
-    if token:
-        return token.decode("utf-8")
-    else:
-        return None
\ No newline at end of file
+    # Ключ живёт столько же, сколько refresh-токен, а не фиксированный час
+    mapping = {"access": token.access_token}
+    if token.expires_in:
+        mapping["expires_at"] = int(time.time()) + token.expires_in
+    if token.refresh_token:
+        mapping["refresh"] = token.refresh_token
+    key = token_key(user_id)
+    async with bot_redis.pipeline(transaction=True) as pipe:
+        pipe.delete(key)
+        pipe.hset(key, mapping=mapping)
+        ttl = token.refresh_expires_in or token.expires_in
+        if ttl:
+            pipe.expire(key, ttl)
+        await pipe.execute()
+
+def _fresh_access_token(fields: dict) -> Optional[str]:
+    if not fields:
+        return None
+    expires_at = int(fields.get(b"expires_at", 0))
+    if expires_at and expires_at - time.time() <= int(TOKEN_REFRESH_MARGIN_SECONDS):
+        return None
+    return fields[b"access"].decode("utf-8")
+
+async def get_token_from_redis(user_id: int) -> Optional[str]:
+    fields = await bot_redis.hgetall(token_key(user_id))
+    if not fields:
+        return None
+    return _fresh_access_token(fields) or await refresh_token_in_redis(user_id)
+
+async def get_token_and_data(
+        user_id: int,
+        state: FSMContext,
+        ) -> Tuple[Optional[str], dict]:
+    # Токен и данные FSM читаются за один запрос к Redis
+    storage = state.storage
+    async with bot_redis.pipeline(transaction=False) as pipe:
+        pipe.hgetall(token_key(user_id))
+        pipe.get(storage.key_builder.build(state.key, "data"))
+        fields, raw_data = await pipe.execute()
+    data = storage.json_loads(raw_data) if raw_data else {}
+    if not fields:
+        return None, data
+    return _fresh_access_token(fields) or await refresh_token_in_redis(user_id), data
+
+async def refresh_token_in_redis(user_id: int) -> Optional[str]:
+    # Повторное использование refresh-токена отзывает сессию, поэтому обновляет только один обработчик
+    try:
+        async with bot_redis.lock(
+                f"user:{user_id}:session:lock",
+                timeout=60,
+                blocking_timeout=30,
+                ):
+            key = token_key(user_id)
+            fields = await bot_redis.hgetall(key)
+            access_token = _fresh_access_token(fields)
+            if access_token or not fields:
+                return access_token
+
+            expires_at = int(fields.get(b"expires_at", 0))
+            current_token = fields[b"access"].decode("utf-8") if expires_at > time.time() else None
+            refresh_token = fields.get(b"refresh")
+            if not refresh_token:
+                return current_token
+            try:
+                token = await notes_api.refresh(refresh_token.decode("utf-8"))
+            except UnauthorizedError:
+                await bot_redis.delete(key)
+                return None
+            except (NotesAPIError, httpx.HTTPError):
+                # API недоступен: пока текущий токен не истёк, работаем с ним
+                return current_token
+            await save_token_to_redis(
+                user_id=user_id,
+                token=token,
+                )
+            return token.access_token
+    except LockError:
+        return None
+
+
+# Числовые сегменты ключа (id чатов и пользователей) сворачиваются в *
+def key_pattern(key: str) -> str:
+    return ":".join("*" if re.fullmatch(r"-?\d+", part) else part for part in key.split(":"))
+
+async def redis_report(batch_size: int = 500) -> dict:
+    report = defaultdict(lambda: {"keys": 0, "bytes": 0, "no_ttl": 0})
+
+    async def measure(keys):
+        async with bot_redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.memory_usage(key)
+                pipe.ttl(key)
+            results = await pipe.execute()
+        for index, key in enumerate(keys):
+            entry = report[key_pattern(key.decode("utf-8", "replace"))]
+            entry["keys"] += 1
+            entry["bytes"] += results[2 * index] or 0
+            if results[2 * index + 1] == -1:
+                entry["no_ttl"] += 1
+
+    batch = []
+    async for key in bot_redis.scan_iter(count=batch_size):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            await measure(batch)
+            batch = []
+    if batch:
+        await measure(batch)
+    return dict(report)
@@ -0,0 +1,226 @@
+import asyncio
+import heapq
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Set
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramNetworkError, TelegramRetryAfter
+from bot_config import (SEND_GLOBAL_RATE,
+                        SEND_CHAT_INTERVAL,
+                        SEND_MAX_RETRIES,
+                        SEND_MAX_PENDING_PER_CHAT,
+                        SEND_SHUTDOWN_TIMEOUT)
+from bot_redis import bot_redis
+from common.token_bucket import TokenBucketLimiter
+
+logger = logging.getLogger("aiogram_bot")
+
+MESSAGE_LIMIT = 4096
+
+
+def split_text(
+        text: str,
+        limit: int = MESSAGE_LIMIT,
+        ) -> List[str]:
+    # Слишком длинная заметка режется по переводам строк, в крайнем случае по символам
+    pieces = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = limit
+        pieces.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    if text:
+        pieces.append(text)
+    return pieces
+
+def chunk_parts(
+        parts: Iterable[str],
+        limit: int = MESSAGE_LIMIT,
+        separator: str = "\n\n",
+        ) -> List[str]:
+    # Части (заметки) склеиваются в сообщения, не разрываясь между ними
+    chunks = []
+    current = ""
+    for part in parts:
+        for piece in split_text(part, limit):
+            if current and len(current) + len(separator) + len(piece) > limit:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current}{separator}{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class SendScheduler:
+    # Очередь на чат и общая куча готовности: чаты обслуживаются по кругу,
+    # следующее сообщение чата ставится в очередь только после доставки предыдущего
+    def __init__(
+            self,
+            global_rate: float,
+            chat_interval: float,
+            max_retries: int,
+            max_pending_per_chat: int,
+            ):
+        self.global_rate = global_rate
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+        self.max_pending_per_chat = max_pending_per_chat
+        # Общий лимит в Redis, чтобы его делили все процессы и реплики бота
+        self.limiter = TokenBucketLimiter(
+            bot_redis,
+            prefix="ratelimit:send",
+            logger=logger,
+            )
+        self.bot: Optional[Bot] = None
+        self._pending: Dict[int, Deque[str]] = {}
+        self._retries: Dict[int, int] = {}
+        self._scheduled: Set[int] = set()
+        self._ready: list = []
+        self._sequence = 0
+        self._wakeup = asyncio.Event()
+        self._inflight: Set[asyncio.Task] = set()
+        self._worker: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.dropped = 0
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "chats": len(self._pending),
+            "queued": sum(len(queue) for queue in self._pending.values()),
+            }
+
+    def send_text(
+            self,
+            chat_id: int,
+            text: str,
+            ):
+        self.send_parts(chat_id, [text])
+
+    def send_parts(
+            self,
+            chat_id: int,
+            parts: Iterable[str],
+            ):
+        queue = self._pending.setdefault(chat_id, deque())
+        for chunk in chunk_parts(parts):
+            if len(queue) >= self.max_pending_per_chat:
+                self.dropped += 1
+                logger.warning("Send queue full for chat %s, message dropped", chat_id)
+                continue
+            queue.append(chunk)
+        if not queue:
+            del self._pending[chat_id]
+            return
+        self._schedule(chat_id, time.monotonic())
+
+    def _schedule(
+            self,
+            chat_id: int,
+            ready_at: float,
+            ):
+        if chat_id in self._scheduled:
+            return
+        self._scheduled.add(chat_id)
+        self._sequence += 1
+        heapq.heappush(self._ready, (ready_at, self._sequence, chat_id))
+        self._wakeup.set()
+
+    async def start(self, bot: Bot):
+        self.bot = bot
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Даём очереди дойти до конца, затем останавливаем воркер
+        deadline = time.monotonic() + float(SEND_SHUTDOWN_TIMEOUT)
+        while (self._pending or self._inflight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self._worker:
+            self._worker.cancel()
+        if self._pending:
+            logger.warning("Send scheduler stopped with %s chats pending", len(self._pending))
+
+    async def _run(self):
+        while True:
+            if not self._ready:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            ready_at, _, chat_id = self._ready[0]
+            delay = ready_at - time.monotonic()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # Запись снимается до похода в Redis: пока ждём лимитер, _deliver может
+            # поставить в кучу другой чат с более ранним ready_at
+            entry = heapq.heappop(self._ready)
+            allowed, retry_after = await self.limiter.consume(
+                "global",
+                rate=self.global_rate,
+                capacity=self.global_rate,
+                )
+            if not allowed:
+                heapq.heappush(self._ready, entry)
+                await asyncio.sleep(retry_after)
+                continue
+
+            task = asyncio.create_task(self._deliver(chat_id))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _deliver(self, chat_id: int):
+        queue = self._pending[chat_id]
+        ready_at = time.monotonic() + self.chat_interval
+        try:
+            await self.bot.send_message(chat_id, queue[0])
+        except (TelegramRetryAfter, TelegramNetworkError) as exc:
+            retries = self._retries.get(chat_id, 0) + 1
+            if retries > self.max_retries:
+                queue.popleft()
+                self._retries.pop(chat_id, None)
+                self.dropped += 1
+                logger.warning("Message to chat %s dropped after %s retries", chat_id, self.max_retries)
+            else:
+                self._retries[chat_id] = retries
+                # Telegram сам сообщает, сколько ждать; при сетевой ошибке - экспоненциальная пауза
+                delay = getattr(exc, "retry_after", None) or self.chat_interval * 2 ** retries
+                ready_at = time.monotonic() + delay
+                logger.info("Send to chat %s deferred for %s s: %s", chat_id, delay, exc)
+        except TelegramAPIError as exc:
+            # Чат недоступен (бот заблокирован, чат удалён): остальное ему не отправить
+            self.dropped += len(queue)
+            queue.clear()
+            self._retries.pop(chat_id, None)
+            logger.warning("Send to chat %s failed: %s", chat_id, exc)
+        except Exception:
+            queue.popleft()
+            self._retries.pop(chat_id, None)
+            self.dropped += 1
+            logger.exception("Unexpected error sending to chat %s", chat_id)
+        else:
+            queue.popleft()
+            self._retries.pop(chat_id, None)
+            self.sent += 1
+        finally:
+            self._scheduled.discard(chat_id)
+            if queue:
+                self._schedule(chat_id, ready_at)
+            else:
+                del self._pending[chat_id]
+
+sender = SendScheduler(
+    global_rate=float(SEND_GLOBAL_RATE),
+    chat_interval=float(SEND_CHAT_INTERVAL),
+    max_retries=int(SEND_MAX_RETRIES),
+    max_pending_per_chat=int(SEND_MAX_PENDING_PER_CHAT),
+    )
@@ -0,0 +1,11 @@
+from common.notes_client.client import NotesClient, RefreshHook
+from common.notes_client.errors import NotesAPIError, NotFoundError, UnauthorizedError
+from common.notes_client.models import (BulkItemResult,
+                                        BulkResult,
+                                        Note,
+                                        NoteChanges,
+                                        NoteSummary,
+                                        Tag,
+                                        TagCount,
+                                        Token,
+                                        User)
@@ -0,0 +1,493 @@
+import asyncio
+from collections import OrderedDict
+from typing import (Any,
+                    AsyncIterator,
+                    Awaitable,
+                    Callable,
+                    Dict,
+                    List,
+                    Optional,
+                    Tuple,
+                    Union)
+import httpx
+from common.notes_client.errors import NotesAPIError, NotFoundError, UnauthorizedError
+from common.notes_client.models import (BulkResult,
+                                        Note,
+                                        NoteChanges,
+                                        NoteSummary,
+                                        TagCount,
+                                        Token,
+                                        User,
+                                        note_adapter,
+                                        note_list_adapter,
+                                        note_summary_list_adapter,
+                                        tag_count_list_adapter)
+
+# Получает просроченный токен и возвращает новый или None, если обновить не удалось
+RefreshHook = Callable[[str], Awaitable[Optional[str]]]
+
+# Повторять можно только запросы, которые не меняют данные на сервере
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRY_STATUS_CODES = {502, 503, 504}
+
+
+class NotesClient:
+    def __init__(
+            self,
+            base_url: str = "",
+            http_client: Optional[httpx.AsyncClient] = None,
+            retries: int = 2,
+            retry_backoff: float = 0.3,
+            cache_size: int = 1024,
+            on_unauthorized: Optional[RefreshHook] = None,
+            ):
+        self._http = http_client or httpx.AsyncClient(base_url=base_url)
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.cache_size = cache_size
+        self.on_unauthorized = on_unauthorized
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self._cache: OrderedDict = OrderedDict()
+        self.requests = 0
+        self.coalesced = 0
+        self.not_modified = 0
+
+    async def __aenter__(self) -> "NotesClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        await self._http.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "not_modified": self.not_modified,
+            "cache_size": len(self._cache),
+            "inflight": len(self._inflight),
+            }
+
+    # Транспорт
+
+    async def _send(
+            self,
+            method: str,
+            path: str,
+            token: Optional[str] = None,
+            headers: Optional[dict] = None,
+            **kwargs,
+            ) -> httpx.Response:
+        retries = self.retries if method in IDEMPOTENT_METHODS else 0
+        refreshed = False
+        attempt = 0
+        while True:
+            request_headers = dict(headers or {})
+            if token:
+                request_headers["Authorization"] = f"Bearer {token}"
+            self.requests += 1
+            try:
+                response = await self._http.request(
+                    method,
+                    path,
+                    headers=request_headers,
+                    **kwargs,
+                    )
+            except (httpx.TimeoutException, httpx.NetworkError):
+                if attempt >= retries:
+                    raise
+            else:
+                # Одна попытка обновить токен, затем запрос повторяется с новым
+                if response.status_code == 401 and token and self.on_unauthorized and not refreshed:
+                    refreshed = True
+                    new_token = await self.on_unauthorized(token)
+                    if not new_token:
+                        return response
+                    token = new_token
+                    continue
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= retries:
+                    return response
+            await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+            attempt += 1
+
+    async def _get(
+            self,
+            path: str,
+            token: Optional[str],
+            params: Optional[dict] = None,
+            ) -> httpx.Response:
+        params = {name: value for name, value in (params or {}).items() if value is not None}
+        key = (path, tuple(sorted(params.items())), token)
+        # Одинаковые GET-запросы, пришедшие одновременно, разделяют один ответ
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, path, token, params))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def _fetch(
+            self,
+            key: tuple,
+            path: str,
+            token: Optional[str],
+            params: dict,
+            ) -> httpx.Response:
+        cached = self._cache.get(key)
+        response = await self._send(
+            "GET",
+            path,
+            token=token,
+            params=params,
+            headers={"If-None-Match": cached[0]} if cached else None,
+            )
+        if response.status_code == 304 and cached:
+            self.not_modified += 1
+            self._cache.move_to_end(key)
+            return cached[1]
+        etag = response.headers.get("etag")
+        if response.status_code == 200 and etag:
+            self._cache[key] = (etag, response)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return response
+
+    @staticmethod
+    def _raise_for_status(response: httpx.Response):
+        if response.status_code < 400:
+            return
+        try:
+            detail = response.json().get("detail")
+        except ValueError:
+            detail = response.text
+        if response.status_code == 401:
+            raise UnauthorizedError(response.status_code, detail)
+        if response.status_code == 404:
+            raise NotFoundError(response.status_code, detail)
+        raise NotesAPIError(response.status_code, detail)
+
+    # Авторизация
+
+    async def login(
+            self,
+            username: str,
+            password: str,
+            ) -> Token:
+        response = await self._send(
+            "POST",
+            "token",
+            data={
+                "username": username,
+                "password": password,
+                },
+            )
+        self._raise_for_status(response)
+        return Token.model_validate_json(response.content)
+
+    async def refresh(
+            self,
+            refresh_token: str,
+            ) -> Token:
+        response = await self._send(
+            "POST",
+            "token/refresh",
+            json={"refresh_token": refresh_token},
+            )
+        self._raise_for_status(response)
+        return Token.model_validate_json(response.content)
+
+    async def revoke(
+            self,
+            refresh_token: str,
+            ):
+        response = await self._send(
+            "POST",
+            "token/revoke",
+            json={"refresh_token": refresh_token},
+            )
+        self._raise_for_status(response)
+
+    async def create_user(
+            self,
+            username: str,
+            password: str,
+            ) -> User:
+        response = await self._send(
+            "POST",
+            "users/",
+            json={
+                "username": username,
+                "password": password,
+                },
+            )
+        self._raise_for_status(response)
+        return User.model_validate_json(response.content)
+
+    # Заметки
+
+    async def list_notes(
+            self,
+            token: str,
+            tag: Optional[str] = None,
+            limit: Optional[int] = None,
+            cursor: Optional[str] = None,
+            summary: bool = False,
+            ) -> Tuple[List[Union[Note, NoteSummary]], Optional[str]]:
+        response = await self._get(
+            "notes/",
+            token,
+            params={
+                "tag": tag,
+                "limit": limit,
+                "cursor": cursor,
+                "summary": "true" if summary else None,
+                },
+            )
+        self._raise_for_status(response)
+        adapter = note_summary_list_adapter if summary else note_list_adapter
+        return adapter.validate_json(response.content), response.headers.get("x-next-cursor")
+
+    async def iter_notes(
+            self,
+            token: str,
+            tag: Optional[str] = None,
+            page_size: Optional[int] = None,
+            summary: bool = False,
+            ) -> AsyncIterator[Union[Note, NoteSummary]]:
+        cursor = None
+        while True:
+            notes, cursor = await self.list_notes(
+                token,
+                tag=tag,
+                limit=page_size,
+                cursor=cursor,
+                summary=summary,
+                )
+            for note in notes:
+                yield note
+            if not cursor:
+                return
+
+    async def get_note(
+            self,
+            token: str,
+            note_id: int,
+            ) -> Note:
+        response = await self._get(f"notes/{note_id}", token)
+        self._raise_for_status(response)
+        return note_adapter.validate_json(response.content)
+
+    async def create_note(
+            self,
+            token: str,
+            title: str,
+            content: str,
+            tags: Optional[List[str]] = None,
+            ) -> Note:
+        response = await self._send(
+            "POST",
+            "notes/",
+            token=token,
+            json={
+                "title": title,
+                "content": content,
+                "tags": tags or [],
+                },
+            )
+        self._raise_for_status(response)
+        return note_adapter.validate_json(response.content)
+
+    async def update_note(
+            self,
+            token: str,
+            note_id: int,
+            title: str,
+            content: str,
+            tags: Optional[List[str]] = None,
+            ) -> Note:
+        response = await self._send(
+            "PUT",
+            f"notes/{note_id}",
+            token=token,
+            json={
+                "title": title,
+                "content": content,
+                "tags": tags,
+                },
+            )
+        self._raise_for_status(response)
+        return note_adapter.validate_json(response.content)
+
+    async def delete_note(
+            self,
+            token: str,
+            note_id: int,
+            ):
+        response = await self._send(
+            "DELETE",
+            f"notes/{note_id}",
+            token=token,
+            )
+        self._raise_for_status(response)
+
+    async def get_changes(
+            self,
+            token: str,
+            since: int = 0,
+            limit: Optional[int] = None,
+            ) -> NoteChanges:
+        response = await self._get(
+            "notes/changes",
+            token,
+            params={
+                "since": since,
+                "limit": limit,
+                },
+            )
+        self._raise_for_status(response)
+        return NoteChanges.model_validate_json(response.content)
+
+    # Пакетные операции
+
+    async def bulk_create(
+            self,
+            token: str,
+            notes: List[Dict[str, Any]],
+            ) -> BulkResult:
+        response = await self._send(
+            "POST",
+            "notes/bulk",
+            token=token,
+            json=notes,
+            )
+        self._raise_for_status(response)
+        return BulkResult.model_validate_json(response.content)
+
+    async def bulk_update(
+            self,
+            token: str,
+            notes: List[Dict[str, Any]],
+            ) -> BulkResult:
+        response = await self._send(
+            "PUT",
+            "notes/bulk",
+            token=token,
+            json=notes,
+            )
+        self._raise_for_status(response)
+        return BulkResult.model_validate_json(response.content)
+
+    async def bulk_delete(
+            self,
+            token: str,
+            note_ids: List[int],
+            ) -> BulkResult:
+        response = await self._send(
+            "POST",
+            "notes/bulk/delete",
+            token=token,
+            json={"ids": note_ids},
+            )
+        self._raise_for_status(response)
+        return BulkResult.model_validate_json(response.content)
+
+    # Поиск и теги
+
+    async def search(
+            self,
+            token: str,
+            tag: Optional[str] = None,
+            q: Optional[str] = None,
+            limit: Optional[int] = None,
+            cursor: Optional[str] = None,
+            ) -> Tuple[List[Note], Optional[str]]:
+        response = await self._get(
+            "search",
+            token,
+            params={
+                "tag": tag,
+                "q": q,
+                "limit": limit,
+                "cursor": cursor,
+                },
+            )
+        # API отвечает 404, если по тегу ничего не найдено
+        if response.status_code == 404:
+            return [], None
+        self._raise_for_status(response)
+        return note_list_adapter.validate_json(response.content), response.headers.get("x-next-cursor")
+
+    async def iter_search(
+            self,
+            token: str,
+            tag: Optional[str] = None,
+            q: Optional[str] = None,
+            page_size: Optional[int] = None,
+            ) -> AsyncIterator[Note]:
+        cursor = None
+        while True:
+            notes, cursor = await self.search(
+                token,
+                tag=tag,
+                q=q,
+                limit=page_size,
+                cursor=cursor,
+                )
+            for note in notes:
+                yield note
+            if not cursor:
+                return
+
+    async def search_text(
+            self,
+            token: str,
+            q: str,
+            limit: Optional[int] = None,
+            offset: int = 0,
+            ) -> List[Note]:
+        response = await self._get(
+            "search/text",
+            token,
+            params={
+                "q": q,
+                "limit": limit,
+                "offset": offset,
+                },
+            )
+        self._raise_for_status(response)
+        return note_list_adapter.validate_json(response.content)
+
+    async def get_tags(
+            self,
+            token: str,
+            limit: Optional[int] = None,
+            ) -> List[TagCount]:
+        response = await self._get(
+            "tags",
+            token,
+            params={"limit": limit},
+            )
+        self._raise_for_status(response)
+        return tag_count_list_adapter.validate_json(response.content)
+
+    async def autocomplete_tags(
+            self,
+            token: str,
+            prefix: str,
+            limit: Optional[int] = None,
+            ) -> List[TagCount]:
+        response = await self._get(
+            "tags/autocomplete",
+            token,
+            params={
+                "prefix": prefix,
+                "limit": limit,
+                },
+            )
+        self._raise_for_status(response)
+        return tag_count_list_adapter.validate_json(response.content)
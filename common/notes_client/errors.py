@@ -0,0 +1,18 @@
+from typing import Any
+
+
+class NotesAPIError(Exception):
+    def __init__(
+            self,
+            status_code: int,
+            detail: Any = None,
+            ):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+class UnauthorizedError(NotesAPIError):
+    pass
+
+class NotFoundError(NotesAPIError):
+    pass
@@ -0,0 +1,58 @@
+from pydantic import BaseModel, TypeAdapter
+from typing import List, Optional
+from datetime import datetime
+
+
+class Tag(BaseModel):
+    id: int
+    name: str
+
+class TagCount(BaseModel):
+    name: str
+    note_count: int
+
+class Note(BaseModel):
+    id: int
+    title: str
+    content: str
+    created_at: datetime
+    updated_at: datetime
+    tags: List[Tag] = []
+
+class NoteSummary(BaseModel):
+    id: int
+    title: str
+    created_at: datetime
+    updated_at: datetime
+    tags: List[Tag] = []
+
+class NoteChanges(BaseModel):
+    notes: List[Note]
+    deleted: List[int]
+    cursor: int
+    has_more: bool
+
+class BulkItemResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    status: str
+    error: Optional[str] = None
+
+class BulkResult(BaseModel):
+    results: List[BulkItemResult]
+
+class Token(BaseModel):
+    access_token: str
+    token_type: str
+    expires_in: Optional[int] = None
+    refresh_token: Optional[str] = None
+    refresh_expires_in: Optional[int] = None
+
+class User(BaseModel):
+    id: int
+    username: str
+
+note_adapter = TypeAdapter(Note)
+note_list_adapter = TypeAdapter(List[Note])
+note_summary_list_adapter = TypeAdapter(List[NoteSummary])
+tag_count_list_adapter = TypeAdapter(List[TagCount])
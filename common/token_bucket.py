@@ -0,0 +1,59 @@
+import logging
+from typing import Optional, Tuple
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+# Ведро хранится в hash {tokens, ts}; время берётся из Redis, чтобы не зависеть от часов реплик
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate / 1000)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = math.ceil((cost - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity * 1000 / rate))
+return {allowed, retry_after}
+"""
+
+
+class TokenBucketLimiter:
+    def __init__(
+            self,
+            redis: Redis,
+            prefix: str = "ratelimit",
+            logger: Optional[logging.Logger] = None,
+            ):
+        self.prefix = prefix
+        # Пишем в логгер сервиса, у которого настроены обработчики
+        self.logger = logger or logging.getLogger(__name__)
+        self._script = redis.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def consume(
+            self,
+            key: str,
+            rate: float,
+            capacity: float,
+            cost: float = 1,
+            ) -> Tuple[bool, float]:
+        # Возвращает (разрешено, через сколько секунд повторить); при недоступности Redis пропускает
+        try:
+            allowed, retry_after_ms = await self._script(
+                keys=[f"{self.prefix}:{key}"],
+                args=[rate, capacity, cost],
+                )
+        except RedisError:
+            self.logger.warning("Rate limiter unavailable, letting request through")
+            return True, 0.0
+        return bool(allowed), int(retry_after_ms) / 1000
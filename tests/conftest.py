@@ -0,0 +1,67 @@
+"""Тесты с базой работают только с отдельной БД из TEST_POSTGRES_*, а не с базой приложения.
+
+Настройки TEST_POSTGRES_* подставляются вместо POSTGRES_* до импорта app, так что движок
+приложения сразу смотрит в тестовую базу. Схема создаётся в начале сессии и удаляется
+в конце вместе со всеми строками, которые записали тесты. Модули, которым нужна база,
+пропускаются целиком, если TEST_POSTGRES_DATABASE не задана: без настроек движок не собрать.
+"""
+import asyncio
+import os
+import pytest
+from dotenv import load_dotenv
+
+load_dotenv()
+
+POSTGRES_SETTINGS = ("HOST", "PORT", "DATABASE", "USERNAME", "PASSWORD")
+
+TEST_DATABASE = os.environ.get("TEST_POSTGRES_DATABASE")
+if TEST_DATABASE:
+    test_host = os.environ.get("TEST_POSTGRES_HOST") or os.environ.get("POSTGRES_HOST")
+    test_port = os.environ.get("TEST_POSTGRES_PORT") or os.environ.get("POSTGRES_PORT")
+    if (TEST_DATABASE, test_host, test_port) == (
+            os.environ.get("POSTGRES_DATABASE"),
+            os.environ.get("POSTGRES_HOST"),
+            os.environ.get("POSTGRES_PORT"),
+            ):
+        raise pytest.UsageError("TEST_POSTGRES_DATABASE must not be the application database")
+    for setting in POSTGRES_SETTINGS:
+        value = os.environ.get(f"TEST_POSTGRES_{setting}")
+        if value:
+            os.environ[f"POSTGRES_{setting}"] = value
+
+# Модули app при импорте пишут лог в logs/
+os.makedirs("logs", exist_ok=True)
+
+
+def run_with_engine(coroutine_factory):
+    # Каждый тест крутит свой цикл событий, соединения пула к нему привязаны
+    from app.database import engine
+
+    async def scenario():
+        try:
+            return await coroutine_factory()
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(scenario())
+
+
+@pytest.fixture(scope="session")
+def test_database():
+    if not TEST_DATABASE:
+        pytest.skip("TEST_POSTGRES_DATABASE is not configured")
+    pytest.importorskip("asyncpg")
+    from sqlalchemy.exc import SQLAlchemyError
+    from app.database import engine
+    from app.models import Base
+
+    async def run_sync(method):
+        async with engine.begin() as conn:
+            await conn.run_sync(method)
+
+    try:
+        run_with_engine(lambda: run_sync(Base.metadata.create_all))
+    except (OSError, SQLAlchemyError) as exc:
+        pytest.skip(f"Test Postgres unavailable: {exc}")
+    yield run_with_engine
+    run_with_engine(lambda: run_sync(Base.metadata.drop_all))
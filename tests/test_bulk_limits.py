@@ -0,0 +1,89 @@
+"""Пакетные запросы максимального размера не должны упираться в лимит параметров.
+
+asyncpg/Postgres принимают не больше 32767 параметров в одном запросе; пакет из
+BULK_MAX_ITEMS заметок с несколькими тегами у каждой легко его превышает.
+Нужна тестовая база из TEST_POSTGRES_* (см. conftest.py).
+"""
+import os
+import uuid
+import pytest
+
+if not os.environ.get("TEST_POSTGRES_DATABASE"):
+    pytest.skip("TEST_POSTGRES_DATABASE is not configured", allow_module_level=True)
+pytest.importorskip("fastapi")
+pytest.importorskip("asyncpg")
+
+import httpx
+from fastapi import FastAPI
+from app.app_config import BULK_MAX_ITEMS
+from app.auth import create_access_token
+from app.crud import create_user
+from app.database import SessionLocal
+from app.fastapi_routes import router
+from app.schemas import UserCreate
+
+api = FastAPI()
+api.include_router(router)
+
+TAGS_PER_NOTE = 4
+
+
+def note_tags(prefix: str, index: int) -> list:
+    # У каждой заметки свои теги: максимум новых тегов и связей на один запрос
+    return [f"{prefix}{index}-{number}" for number in range(TAGS_PER_NOTE)]
+
+async def bulk_scenario():
+    async with SessionLocal() as db:
+        user = await create_user(
+            db=db,
+            user=UserCreate(
+                username=f"bulklimit_{uuid.uuid4().hex[:8]}",
+                password="password",
+                ),
+            )
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': user.username, 'uid': user.id})}"}
+    size = int(BULK_MAX_ITEMS)
+
+    async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=api),
+            base_url="http://test",
+            timeout=None,
+            ) as client:
+        response = await client.post(
+            "/notes/bulk",
+            json=[
+                {"title": f"note {index}", "content": "content", "tags": note_tags("a", index)}
+                for index in range(size)
+                ],
+            headers=headers,
+            )
+        assert response.status_code == 200, response.text
+        note_ids = [result["id"] for result in response.json()["results"]]
+        assert len(note_ids) == size
+
+        # Все старые связи удаляются, все новые добавляются
+        response = await client.put(
+            "/notes/bulk",
+            json=[
+                {"id": note_id, "title": "updated", "content": "content", "tags": note_tags("b", index)}
+                for index, note_id in enumerate(note_ids)
+                ],
+            headers=headers,
+            )
+        assert response.status_code == 200, response.text
+        assert {result["status"] for result in response.json()["results"]} == {"updated"}
+
+        response = await client.get("/tags", params={"limit": 5}, headers=headers)
+        assert response.status_code == 200, response.text
+        assert all(tag["name"].startswith("b") for tag in response.json())
+
+        response = await client.post(
+            "/notes/bulk/delete",
+            json={"ids": note_ids},
+            headers=headers,
+            )
+        assert response.status_code == 200, response.text
+        assert {result["status"] for result in response.json()["results"]} == {"deleted"}
+
+def test_bulk_requests_at_max_size(test_database):
+    test_database(bulk_scenario)
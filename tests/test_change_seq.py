@@ -0,0 +1,104 @@
+"""change_seq одного пользователя должен идти в порядке коммитов.
+
+Иначе клиент, забравший изменения после since=N, навсегда пропустит запись с меньшим
+номером, закоммиченную позже. Нужна тестовая база из TEST_POSTGRES_* (см. conftest.py).
+"""
+import asyncio
+import os
+import uuid
+import pytest
+
+if not os.environ.get("TEST_POSTGRES_DATABASE"):
+    pytest.skip("TEST_POSTGRES_DATABASE is not configured", allow_module_level=True)
+pytest.importorskip("asyncpg")
+
+from sqlalchemy import text
+from app import crud
+from app.database import SessionLocal
+from app.models import Note
+from app.schemas import NoteBulkUpdate, NoteCreate, NoteUpdate, UserCreate
+
+
+async def new_user_id() -> int:
+    async with SessionLocal() as db:
+        user = await crud.create_user(
+            db=db,
+            user=UserCreate(
+                username=f"changeseq_{uuid.uuid4().hex[:8]}",
+                password="password",
+                ),
+            )
+    return user.id
+
+async def new_note_id(user_id: int) -> int:
+    async with SessionLocal() as db:
+        note = await crud.create_note(
+            db=db,
+            note=NoteCreate(title="existing", content="content", tags=["changeseq"]),
+            user_id=user_id,
+            )
+    return note.id
+
+async def update_note(db, user_id, note_id):
+    db_note = await crud.get_note_by_id(db, note_id, user_id)
+    await crud.update_note(db, db_note, NoteUpdate(title="updated", content="content", tags=["other"]))
+
+async def delete_note(db, user_id, note_id):
+    db_note = await crud.get_note_by_id(db, note_id, user_id)
+    await crud.delete_note(db, db_note)
+
+WRITES = {
+    "create_note": lambda db, user_id, note_id: crud.create_note(
+        db, NoteCreate(title="new", content="content", tags=["changeseq"]), user_id,
+        ),
+    "update_note": update_note,
+    "delete_note": delete_note,
+    "bulk_create_notes": lambda db, user_id, note_id: crud.bulk_create_notes(
+        db, [NoteCreate(title="new", content="content", tags=["changeseq"])], user_id,
+        ),
+    "bulk_update_notes": lambda db, user_id, note_id: crud.bulk_update_notes(
+        db, [NoteBulkUpdate(id=note_id, title="updated", content="content", tags=["other"])], user_id,
+        ),
+    "bulk_delete_notes": lambda db, user_id, note_id: crud.bulk_delete_notes(
+        db, [note_id], user_id,
+        ),
+    }
+
+async def wait_until_blocked(db, timeout: float = 5):
+    # Запись стоит на блокировке строки пользователя
+    deadline = asyncio.get_running_loop().time() + timeout
+    while asyncio.get_running_loop().time() < deadline:
+        result = await db.execute(text(
+            "SELECT count(*) FROM pg_stat_activity "
+            "WHERE datname = current_database() AND wait_event_type = 'Lock'"
+            ))
+        if result.scalar():
+            return
+        await asyncio.sleep(0.02)
+    raise AssertionError("write did not wait for the user row lock")
+
+async def commit_order_scenario(write):
+    user_id = await new_user_id()
+    note_id = await new_note_id(user_id)
+
+    async with SessionLocal() as first, SessionLocal() as second, SessionLocal() as monitor:
+        # Первая запись держит блокировку пользователя, вторая стартует и ждёт её
+        await crud.bump_notes_version(first, user_id)
+        pending = asyncio.create_task(write(second, user_id, note_id))
+        await wait_until_blocked(monitor)
+        # Номер первой записи выдаётся, пока вторая ждёт; коммитится она раньше второй
+        first_note = Note(title="first", content="content", user_id=user_id, tags=[])
+        first.add(first_note)
+        await first.commit()
+        await pending
+
+    async with SessionLocal() as db:
+        notes, tombstones, _, _ = await crud.get_note_changes(db, user_id, since=0, limit=100)
+    last = max(notes + tombstones, key=lambda change: change.change_seq)
+    return first_note.id, getattr(last, "note_id", None) or last.id
+
+@pytest.mark.parametrize("write_name", sorted(WRITES))
+def test_change_seq_follows_commit_order(test_database, write_name):
+    first_note_id, last_change_id = test_database(lambda: commit_order_scenario(WRITES[write_name]))
+    # Последнее по change_seq изменение - это запись, закоммиченная последней
+    assert last_change_id != first_note_id
@@ -0,0 +1,100 @@
+"""Число SQL-запросов на чтение не должно расти с числом заметок (N+1).
+
+Нужна тестовая база из TEST_POSTGRES_* (см. conftest.py); без неё тест пропускается.
+"""
+import os
+import uuid
+import pytest
+
+if not os.environ.get("TEST_POSTGRES_DATABASE"):
+    pytest.skip("TEST_POSTGRES_DATABASE is not configured", allow_module_level=True)
+pytest.importorskip("fastapi")
+pytest.importorskip("asyncpg")
+
+import httpx
+from fastapi import FastAPI
+from app.auth import create_access_token, user_cache
+from app.crud import bulk_create_notes, create_user
+from app.database import SessionLocal
+from app.fastapi_routes import router
+from app.metrics import RequestDBStats, request_db_stats
+from app.schemas import NoteCreate, UserCreate
+
+# Только роутер, без MetricsMiddleware: счётчик запросов выставляет сам тест
+api = FastAPI()
+api.include_router(router)
+
+
+async def count_queries(
+        client: httpx.AsyncClient,
+        url: str,
+        token: str,
+        ) -> int:
+    # Пользователь каждый раз грузится из БД, чтобы замеры были сравнимы
+    user_cache.clear()
+    stats = RequestDBStats()
+    context_token = request_db_stats.set(stats)
+    try:
+        response = await client.get(
+            url,
+            headers={"Authorization": f"Bearer {token}"},
+            )
+    finally:
+        request_db_stats.reset(context_token)
+    assert response.status_code == 200, response.text
+    return stats.queries
+
+async def add_notes(
+        user_id: int,
+        start: int,
+        stop: int,
+        ) -> list:
+    async with SessionLocal() as db:
+        return await bulk_create_notes(
+            db=db,
+            notes=[
+                NoteCreate(
+                    title=f"note {index}",
+                    content="content",
+                    tags=["querycount", f"tag{index % 5}"],
+                    )
+                for index in range(start, stop)
+                ],
+            user_id=user_id,
+            )
+
+async def measure_query_counts():
+    async with SessionLocal() as db:
+        user = await create_user(
+            db=db,
+            user=UserCreate(
+                username=f"querycount_{uuid.uuid4().hex[:8]}",
+                password="password",
+                ),
+            )
+    token = create_access_token({"sub": user.username, "uid": user.id})
+
+    counts = {}
+    total = 0
+    note_id = None
+    async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=api),
+            base_url="http://test",
+            ) as client:
+        for size in (3, 30):
+            note_ids = await add_notes(user.id, total, size)
+            note_id = note_id or note_ids[0]
+            total = size
+            counts[size] = {
+                url: await count_queries(client, url, token)
+                for url in (
+                    "/notes/?limit=100",
+                    "/search?tag=querycount&limit=100",
+                    f"/notes/{note_id}",
+                    )
+                }
+    return counts
+
+def test_read_query_count_does_not_grow_with_notes(test_database):
+    counts = test_database(measure_query_counts)
+    assert counts[3] == counts[30]